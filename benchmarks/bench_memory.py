@@ -0,0 +1,51 @@
+"""Memory held per parsed message, for the eager, lazy and compact representations
+
+    PYTHONPATH=. python benchmarks/bench_memory.py [count]
+"""
+import gc
+import sys
+import tracemalloc
+
+from py8583 import py8583, py8583spec
+
+
+def sample_messages(spec, count):
+    messages = []
+    for i in range(count):
+        IsoPacket = py8583.Iso8583(iso_spec=spec)
+        IsoPacket.mti('0200')
+        values = {2: '4761739001010119', 3: 0, 4: 1000 + i, 7: 1018123456, 11: i % 1000000, 12: 123456, 13: 1018,
+                  14: 2912, 18: 5411, 22: 51, 25: 0, 32: '123456', 37: '%012d' % i, 41: 'TERM0001',
+                  42: 'MERCHANT0000001', 49: 978}
+        for field, value in values.items():
+            IsoPacket.field(field, 1)
+            IsoPacket.field_data(field, value)
+        messages.append(IsoPacket.build_iso())
+    return messages
+
+
+def measure(messages, spec, **options):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # each message is parsed from a copy of its own, counted when the parsed message keeps it
+    parsed = [py8583.Iso8583(bytes(memoryview(message)), iso_spec=spec, **options) for message in messages]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del parsed
+    return (after - before) / len(messages)
+
+
+def main(count=10000):
+    spec = py8583spec.IsoSpec1987ASCII()
+    messages = sample_messages(spec, count)
+
+    print("{0} messages of {1} bytes".format(count, len(messages[0])))
+    for name, options in (('eager', {}), ('lazy', {'lazy': True}), ('compact', {'compact': True})):
+        # the raw message is let go by eager messages, and kept by lazy and compact ones
+        print("{0:<8} {1:>8.0f} bytes/message".format(name, measure(messages, spec, **options)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
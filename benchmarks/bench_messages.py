@@ -0,0 +1,228 @@
+"""Parse and build throughput, latency and allocations across specs and message shapes
+
+    PYTHONPATH=. python benchmarks/bench_messages.py [--output results.json] [--compare baseline.json]
+
+Each case is timed --repeat times, the median of the runs being kept for every timing. Results
+are printed and optionally written as JSON. With --compare, each result is checked against a
+stored run and the regressions beyond --threshold (--tail-threshold for the p99 latencies, far
+noisier than the medians) are listed, the exit status being 1 when there is any.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from py8583 import py8583, py8583spec
+from py8583.codec import ContentCharacters
+from py8583.enums import LT
+
+
+Specs = ('IsoSpec1987ASCII', 'IsoSpec1987BCD', 'BICISO', 'IsoSpec1993ASCII')
+
+# shape -> data fields of the message, the secondary bitmap being there for fields above 64
+Shapes = {
+    'small': (3, 4, 11, 41),
+    'small_secondary': (3, 4, 11, 41, 70),
+    'large': tuple(range(2, 65)),
+    'large_secondary': tuple(field for field in range(2, 129) if field != 65),
+}
+
+# metric -> True when higher is better
+Metrics = {
+    'parse_per_sec': True, 'parse_p50_us': False, 'parse_p99_us': False,
+    'build_per_sec': True, 'build_p50_us': False, 'build_p99_us': False,
+    'parse_alloc_bytes': False, 'parse_alloc_blocks': False,
+    'build_alloc_bytes': False, 'build_alloc_blocks': False,
+}
+
+# metrics compared against the tail threshold
+TailMetrics = ('parse_p99_us', 'build_p99_us')
+
+
+def set_field(rnd, IsoPacket, field):
+    # Set a field to a random value of its content type, of its full length when fixed
+    spec = IsoPacket._iso_spec
+    content_type = spec.content_type(field)
+    max_length = spec.max_length(field)
+    length = max_length if spec.length_type(field) == LT.FIXED else min(max_length, 32)
+
+    if content_type == 'b':
+        # binary and hex text fields, whose lengths are in bytes
+        IsoPacket.field_bytes(field, bytes(rnd.getrandbits(8) for _ in range(length)))
+    elif content_type == 'n':
+        IsoPacket.field_data(field, rnd.randint(0, 10 ** min(length, 18) - 1))
+    elif content_type == 'z':
+        IsoPacket.field_data(field, ''.join(rnd.choice('0123456789') for _ in range(length - 1)) + '=')
+    else:
+        # no spaces, which would be taken for padding
+        characters = ContentCharacters[content_type].replace(b' ', b'').decode('latin')
+        IsoPacket.field_data(field, ''.join(rnd.choice(characters) for _ in range(length)))
+    IsoPacket.field(field, 1)
+
+
+def sample_message(spec, fields, seed=8583):
+    rnd = random.Random(seed)
+
+    IsoPacket = py8583.Iso8583(iso_spec=spec)
+    IsoPacket.mti('1200' if '1993' in type(spec).__name__ else '0200')
+    for field in fields:
+        if field not in spec.ContentTypes:
+            continue
+        set_field(rnd, IsoPacket, field)
+        try:
+            parsed = py8583.Iso8583(IsoPacket.build_iso(), iso_spec=spec).field_data(field)
+        except Exception:
+            parsed = None
+        if parsed != IsoPacket.field_data(field):
+            # fields the spec cannot carry this way (e.g. track 2 in BCD) are left out
+            IsoPacket.field(field, 0)
+            del IsoPacket._field_data[field]
+
+    return IsoPacket
+
+
+def timings(function, number):
+    # per_sec, p50_us and p99_us of number calls
+    samples = []
+    clock = time.perf_counter_ns
+    for _ in range(number):
+        start = clock()
+        function()
+        samples.append(clock() - start)
+
+    samples.sort()
+    total = sum(samples)
+    return {
+        'per_sec': number / (total / 1e9),
+        'p50_us': samples[number // 2] / 1e3,
+        'p99_us': samples[min(number - 1, number * 99 // 100)] / 1e3,
+    }
+
+
+def allocations(function, number=100):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        kept = [function() for _ in range(number)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    del kept
+    return size / number, blocks / number
+
+
+def make_case(spec_name, shape):
+    # (result with the message size and allocations, (('parse', parse), ('build', build)))
+    spec = getattr(py8583spec, spec_name)()
+    built = sample_message(spec, Shapes[shape])
+    content = built.build_iso()
+    # the timings are only meaningful for messages that parse back to the values built
+    parsed = py8583.Iso8583(content, iso_spec=spec)
+    assert parsed.fields() == built.fields(), "{0}/{1} does not parse back".format(spec_name, shape)
+
+    def parse():
+        return py8583.Iso8583(content, iso_spec=spec)
+
+    # warm up the spec tables and the caches
+    parse()
+
+    result = {'size': len(content), 'fields': len(built.fields())}
+    functions = (('parse', parse), ('build', built.build_iso))
+    for name, function in functions:
+        result['{0}_alloc_bytes'.format(name)], result['{0}_alloc_blocks'.format(name)] = allocations(function)
+    return result, functions
+
+
+def run(specs, shapes, number, repeat):
+    cases = {}
+    for spec_name in specs:
+        for shape in shapes:
+            cases['{0}/{1}'.format(spec_name, shape)] = make_case(spec_name, shape)
+
+    # each round times every case once, for a slowdown of the machine to be spread over all of them
+    runs = {}
+    for _ in range(repeat):
+        for case, (_, functions) in cases.items():
+            for name, function in functions:
+                runs.setdefault((case, name), []).append(timings(function, number))
+
+    results = {}
+    for case, (result, functions) in cases.items():
+        for name, _ in functions:
+            for metric in runs[case, name][0]:
+                result['{0}_{1}'.format(name, metric)] = statistics.median(run[metric] for run in runs[case, name])
+        results[case] = result
+    return results
+
+
+def compare(results, baseline, threshold, tail_threshold):
+    # Yield (case, metric, baseline value, value, change) of the metrics that got worse by more than
+    # threshold, or tail_threshold for the TailMetrics
+    for case, result in results.items():
+        reference = baseline.get(case)
+        if reference is None:
+            continue
+
+        for metric, higher_is_better in Metrics.items():
+            if not reference.get(metric) or metric not in result:
+                continue
+            change = (result[metric] - reference[metric]) / reference[metric]
+            limit = tail_threshold if metric in TailMetrics else threshold
+            if (-change if higher_is_better else change) > limit:
+                yield case, metric, reference[metric], result[metric], change
+
+
+def print_results(results):
+    print("{0:<34} {1:>6} {2:>11} {3:>9} {4:>9} {5:>9} {6:>11} {7:>9} {8:>9} {9:>9}".format(
+        'case', 'bytes', 'parse/s', 'p50 us', 'p99 us', 'alloc B', 'build/s', 'p50 us', 'p99 us', 'alloc B'))
+    for case, result in results.items():
+        print("{0:<34} {1[size]:>6} {1[parse_per_sec]:>11.0f} {1[parse_p50_us]:>9.1f} {1[parse_p99_us]:>9.1f} "
+              "{1[parse_alloc_bytes]:>9.0f} {1[build_per_sec]:>11.0f} {1[build_p50_us]:>9.1f} "
+              "{1[build_p99_us]:>9.1f} {1[build_alloc_bytes]:>9.0f}".format(case, result))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spec', action='append', choices=Specs, help="spec to run, all by default")
+    parser.add_argument('--shape', action='append', choices=sorted(Shapes), help="message shape, all by default")
+    parser.add_argument('--number', type=int, default=2000, help="calls timed per run")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per case, their median being kept")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of a previous run to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.10, help="relative change reported as a regression")
+    parser.add_argument('--tail-threshold', type=float, default=0.50,
+                        help="relative change of the p99 latencies reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.spec or Specs, args.shape or list(Shapes), args.number, args.repeat)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(), 'results': results},
+                      f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+        regressions = list(compare(results, baseline, args.threshold, args.tail_threshold))
+        for case, metric, before, after, change in regressions:
+            print("REGRESSION {0} {1}: {2:.1f} -> {3:.1f} ({4:+.0%})".format(case, metric, before, after, change))
+        if regressions:
+            return 1
+        print("No regression beyond {0:.0%} ({1:.0%} for p99 latencies)".format(args.threshold, args.tail_threshold))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
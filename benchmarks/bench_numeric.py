@@ -0,0 +1,52 @@
+"""Numeric codec micro-benchmarks, against the former hexlify round trips and format() calls
+
+    PYTHONPATH=. python benchmarks/bench_numeric.py
+"""
+import binascii
+import timeit
+
+from py8583 import numeric
+
+
+def hex_bcd_to_int(bcd):
+    return int(binascii.hexlify(bcd).decode('latin'), 16)
+
+
+def hex_str_to_bcd(string):
+    if len(string) % 2 == 1:
+        string = string.zfill(len(string) + 1)
+    return binascii.unhexlify(string)
+
+
+def hex_ascii_to_int(data):
+    return int(bytes(data), 16)
+
+
+view = memoryview(b'\x37\x12\x34\x56\x78\x90')
+text = memoryview(b'123456789012')
+
+Cases = (
+    ('bcd_to_int LLVAR length', lambda: hex_bcd_to_int(view[0:1]), lambda: numeric.bcd_to_int(view[0:1])),
+    ('bcd_to_int LLLVAR length', lambda: hex_bcd_to_int(view[0:2]), lambda: numeric.bcd_to_int(view[0:2])),
+    ('bcd_to_int amount', lambda: hex_bcd_to_int(view[0:6]), lambda: numeric.bcd_to_int(view[0:6])),
+    ('int_to_bcd LLVAR length', lambda: hex_str_to_bcd(format(37, '02d')), lambda: numeric.int_to_bcd(37, 2)),
+    ('int_to_bcd amount', lambda: hex_str_to_bcd(format(1234, '012d')), lambda: numeric.int_to_bcd(1234, 12)),
+    ('ascii_to_int length', lambda: hex_ascii_to_int(text[0:2]), lambda: numeric.ascii_to_int(text[0:2])),
+    ('ascii_to_int amount', lambda: hex_ascii_to_int(text[0:12]), lambda: numeric.ascii_to_int(text[0:12])),
+    ('int_to_ascii amount', lambda: format(1234, '012d').encode('latin'), lambda: numeric.int_to_ascii(1234, 12)),
+)
+
+
+def main(number=200000, repeat=15):
+    print("{0:<26} {1:>10} {2:>10}".format('', 'former', 'numeric'))
+    for name, old, new in Cases:
+        # best of interleaved repeats, the others being slowed by whatever else runs
+        old_time = new_time = float('inf')
+        for _ in range(repeat):
+            old_time = min(old_time, timeit.timeit(old, number=number))
+            new_time = min(new_time, timeit.timeit(new, number=number))
+        print("{0:<26} {1:>8.0f}ns {2:>8.0f}ns".format(name, old_time / number * 1e9, new_time / number * 1e9))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+from py8583.codec import DATA_FIELDS, field_bit, bitmap_fields, read_bitmap, field_layout
+from py8583.enums import DT, LT
+from py8583.errors import ParseError
+from py8583.py8583 import buffer_view, check_mti
+from py8583.py8583spec import IsoSpec1987ASCII
+
+try:
+    import numpy
+except ImportError:  # numpy is only needed for as_numpy=True
+    numpy = None
+
+# Most decimal digits that always fit in an int64
+MaxDigits = 18
+
+
+def parse_many(messages, spec=None, fields=None, as_numpy=False):
+    """Parse an iterable of messages into columns
+
+    Returns a dict with an 'mti' column, one column per field number and an 'error'
+    column, all lists of one entry per message. Fields missing from a message are None,
+    as are all the values of a message that failed to parse, its error column holding
+    the reason instead. Only the given fields are decoded when fields is set.
+    With as_numpy, numeric columns are turned into int64 (masked) numpy arrays. The raw
+    digits of fixed length ASCII, EBCDIC and BCD numeric fields are then gathered and converted
+    all at once, a value that is not made of decimal digits being masked and reported in
+    the error column of its message.
+    """
+    spec = spec if spec is not None else IsoSpec1987ASCII()
+    codecs = spec.compile()
+    decode_mti = codecs[0].decode
+
+    columns = {'mti': [], 'error': []}
+    wanted = DATA_FIELDS
+    walked = DATA_FIELDS
+
+    if fields is not None:
+        wanted = 0
+        for field in fields:
+            wanted |= field_bit(field)
+            columns[field] = []
+        # there is no need to walk past the last wanted field
+        walked = DATA_FIELDS & ~((wanted & -wanted) - 1) if wanted else 0
+
+    # fields whose raw digits are kept for decode_digits()
+    raw = 0
+    if as_numpy:
+        if numpy is None:
+            raise ImportError("as_numpy requires numpy")
+
+        for codec in codecs[2:]:
+            if digits_size(codec):
+                raw |= field_bit(codec.field)
+        raw &= wanted
+
+    # bitmap -> layout of the wanted fields when the walked fields all have a fixed size
+    # (see fixed_layout), None otherwise
+    layouts = {}
+
+    mtis, errors = columns['mti'], columns['error']
+    rows = 0
+
+    for message in messages:
+        try:
+            iso = buffer_view(message)
+            # raw digits are sliced out of bytes messages as bytes, lighter than memoryviews
+            source = message if type(message) is bytes else iso
+            mti, p = decode_mti(iso, 0)
+            check_mti(mti)
+            bitmap, p = read_bitmap(codecs, iso, p)
+
+            try:
+                layout = layouts[bitmap]
+            except KeyError:
+                layout = layouts[bitmap] = fixed_layout(codecs, bitmap & walked, wanted, raw, p)
+
+            values = []
+            if layout is not None and layout[0] <= len(iso):
+                # same offsets as the previous messages with this bitmap, no walking needed
+                for field, start, length, end, is_raw in layout[1]:
+                    if is_raw:
+                        values.append((field, source[start:end]))
+                    else:
+                        values.append((field, codecs[field].load(iso, start, length)))
+                p = layout[0]
+
+            else:
+                for field in bitmap_fields(bitmap & walked):
+                    codec = codecs[field]
+                    if raw & field_bit(field):
+                        start, _, p = codec.scan(iso, p)
+                        if p > len(iso):
+                            raise ParseError("F{0} is truncated".format(field))
+                        values.append((field, source[start:p]))
+                    elif wanted & field_bit(field):
+                        value, p = codec.decode(iso, p)
+                        values.append((field, value))
+                    else:
+                        p = codec.scan(iso, p)[2]
+        except Exception as ex:
+            mtis.append(None)
+            errors.append(str(ex) or type(ex).__name__)
+        else:
+            mtis.append(mti)
+            errors.append(None)
+
+            for field, value in values:
+                column = columns.get(field)
+                if column is None:
+                    column = columns[field] = []
+                if len(column) < rows:
+                    column.extend([None] * (rows - len(column)))
+                column.append(value)
+
+        rows += 1
+
+    for column in columns.values():
+        if len(column) < rows:
+            column.extend([None] * (rows - len(column)))
+
+    if as_numpy:
+        for field, column in columns.items():
+            if field in ('mti', 'error') or codecs[field].content_type != 'n':
+                continue
+            if raw & field_bit(field):
+                columns[field] = digit_array(column, codecs[field], errors)
+            else:
+                columns[field] = numeric_array(column)
+
+    return columns
+
+
+def fixed_layout(codecs, bitmap, wanted, raw, p):
+    # (end, [(field, start, length, end, raw digits)...]) of the wanted fields flagged in bitmap, with
+    # the data fields starting at p, or None when one of the fields has a variable size.
+    # Fixed size fields are laid out without reading the message, see field_layout().
+    layout = field_layout(codecs, bitmap, p)
+    if layout.steps:
+        return None
+
+    return layout.end, tuple((field, start, length, end, bool(raw & field_bit(field)))
+                             for field, start, length, end in layout.fixed if wanted & field_bit(field))
+
+
+def digits_size(codec):
+    # Byte size of the fixed length numeric fields decode_digits() handles, 0 for the others
+    if codec.content_type != 'n' or codec.len_type != LT.FIXED or not codec.max_length:
+        return 0
+    if codec.data_type in (DT.ASCII, DT.EBCDIC) and codec.max_length <= MaxDigits:
+        return codec.max_length
+    if codec.data_type == DT.BCD and codec.max_length + 1 <= MaxDigits:
+        return (codec.max_length + 1) // 2
+    return 0
+
+
+def decode_digits(raw, data_type):
+    """Decode a (messages, bytes) uint8 array of ASCII, EBCDIC or packed BCD digits to int64 values
+
+    Returns the values and a boolean array flagging the rows that are not decimal digits.
+    """
+    if data_type == DT.ASCII:
+        digits = raw - numpy.uint8(0x30)
+    elif data_type == DT.EBCDIC:
+        digits = raw - numpy.uint8(0xF0)
+    elif data_type == DT.BCD:
+        digits = numpy.empty((raw.shape[0], raw.shape[1] * 2), dtype=numpy.uint8)
+        digits[:, 0::2] = raw >> 4
+        digits[:, 1::2] = raw & 0x0F
+    else:
+        raise ValueError("Only ASCII, EBCDIC and BCD digits can be decoded")
+
+    invalid = (digits > 9).any(axis=1)
+    powers = 10 ** numpy.arange(digits.shape[1] - 1, -1, -1, dtype=numpy.int64)
+    return digits.astype(numpy.int64) @ powers, invalid
+
+
+def digit_array(column, codec, errors):
+    # int64 (masked) array of a column of raw digits
+    size = digits_size(codec)
+    missing = bytes(size)
+    raw = numpy.frombuffer(b''.join(missing if value is None else value for value in column), dtype=numpy.uint8)
+    values, invalid = decode_digits(raw.reshape(len(column), size), codec.data_type)
+
+    mask = numpy.fromiter((value is None for value in column), dtype=bool, count=len(column))
+    invalid &= ~mask
+    for row in numpy.flatnonzero(invalid):
+        if errors[row] is None:
+            errors[row] = "F{0} is not numeric".format(codec.field)
+
+    mask |= invalid
+    if mask.any():
+        return numpy.ma.masked_array(values, mask=mask)
+    return values
+
+
+def numeric_array(column):
+    # int64 array of a numeric column, masked where values are missing.
+    # Columns that do not fit in int64 (e.g. 19 digit PANs) are left as lists.
+    mask = [value is None for value in column]
+    try:
+        if any(mask):
+            return numpy.ma.masked_array([0 if value is None else value for value in column], mask=mask,
+                                         dtype=numpy.int64)
+        return numpy.array(column, dtype=numpy.int64)
+    except OverflowError:
+        return column
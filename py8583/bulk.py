@@ -0,0 +1,75 @@
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from py8583.batch import parse_many
+from py8583.enums import LH
+from py8583.framing import header_size, decode_header, frame_offsets
+from py8583.errors import ParseError
+
+DefaultChunkSize = 4 * 1024 * 1024
+
+
+def plan_chunks(path, length_header=LH.BIN2, chunk_size=DefaultChunkSize):
+    """Yield (start, end) byte ranges of a framed message file, each holding whole frames
+
+    Only the length headers are read, jumping from one frame to the next.
+    """
+    size = header_size(length_header)
+    if size == 0:
+        raise ValueError("A framed file can only be split on a length header")
+
+    file_size = os.path.getsize(path)
+    if file_size == 0:
+        return
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = p = 0
+        while p < file_size:
+            length = decode_header(length_header, data, p)
+            if p + size + length > file_size:
+                raise ParseError("Truncated frame at offset {0}".format(p))
+
+            p += size + length
+            if p - start >= chunk_size:
+                yield start, p
+                start = p
+
+        if start < p:
+            yield start, p
+
+
+def decode_chunk(path, start, end, length_header=LH.BIN2, spec=None, fields=None):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = memoryview(f.read(end - start))
+
+    messages = [data[s:e] for s, e in frame_offsets(data, length_header)]
+    return parse_many(messages, spec, fields)
+
+
+def decode_file(path, spec=None, length_header=LH.BIN2, fields=None, chunk_size=DefaultChunkSize, workers=None):
+    """Parse a framed message file on a pool of worker processes
+
+    The file is split into chunks of about chunk_size bytes on frame boundaries, and each
+    chunk is parsed by parse_many in a worker. The column dicts of the chunks are yielded
+    in file order, with at most two chunks per worker in flight.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        try:
+            for start, end in plan_chunks(path, length_header, chunk_size):
+                pending.append(executor.submit(decode_chunk, path, start, end, length_header, spec, fields))
+
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
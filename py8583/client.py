@@ -0,0 +1,165 @@
+import asyncio
+import itertools
+import logging
+
+from py8583.enums import LH
+from py8583.framing import TPDU_SIZE, header_size, decode_header, encode_header
+from py8583.py8583 import Iso8583
+from py8583.py8583spec import IsoSpec1987ASCII
+
+
+log = logging.getLogger('py8583.client')
+
+
+class IsoConnection:
+    # One persistent connection of an IsoClient, with any number of requests in flight
+
+    def __init__(self, client, reader, writer):
+        self.client = client
+        self.reader = reader
+        self.writer = writer
+        self.pending = set()
+        self.write_lock = asyncio.Lock()
+        self.read_task = asyncio.ensure_future(self.read_responses())
+
+    @property
+    def closed(self):
+        return self.read_task.done()
+
+    async def send(self, data):
+        async with self.write_lock:
+            self.writer.write(data)
+            await self.writer.drain()
+
+    async def read_responses(self):
+        client = self.client
+        size = header_size(client.length_header)
+        error = ConnectionError("Connection closed")
+
+        try:
+            while True:
+                header = await self.reader.readexactly(size)
+                frame = await self.reader.readexactly(decode_header(client.length_header, header))
+                if client.tpdu is not None:
+                    frame = frame[TPDU_SIZE:]
+
+                try:
+                    response = Iso8583(frame, iso_spec=client.spec, lazy=True, metrics=client.metrics)
+                    key = client.message_key(response)
+                except Exception as ex:
+                    log.warning("Dropping unparsable response: {0}".format(ex))
+                    continue
+
+                future = client.pending.pop(key, None)
+                if future is None:
+                    log.warning("Dropping unmatched response {0}".format(key))
+                    continue
+
+                self.pending.discard(key)
+                if not future.done():
+                    future.set_result(response)
+        except asyncio.IncompleteReadError:
+            pass
+        except Exception as ex:
+            error = ex
+        finally:
+            self.writer.close()
+            for key in self.pending:
+                future = client.pending.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await asyncio.gather(self.read_task, return_exceptions=True)
+
+
+class IsoClient:
+    """Multiplexing asyncio client for a scheme or issuer link
+
+    Requests are spread over a pool of persistent connections with any number of them in
+    flight per connection. Responses are matched to their request on the values of the
+    key_fields (e.g. STAN, RRN and terminal id) through a table of pending futures, so they
+    may come back in any order. Closed connections are reopened on the next request.
+    """
+
+    def __init__(self, host, port, spec=None, length_header=LH.BIN2, tpdu=None, pool_size=2,
+                 key_fields=(11, 37, 41), timeout=30, metrics=None):
+        if header_size(length_header) == 0:
+            raise ValueError("A length header is needed to frame messages on a stream")
+
+        self.host = host
+        self.port = port
+        self.spec = spec if spec is not None else IsoSpec1987ASCII()
+        self.length_header = length_header
+        self.tpdu = tpdu
+        self.pool_size = pool_size
+        self.key_fields = tuple(key_fields)
+        self.timeout = timeout
+        # IsoMetrics of the responses parsed, if any
+        self.metrics = metrics
+
+        # message key -> future of the response
+        self.pending = {}
+        self._connections = [None] * pool_size
+        self._connect_locks = [asyncio.Lock() for _ in range(pool_size)]
+        self._next = itertools.cycle(range(pool_size))
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        await asyncio.gather(*(self.connection(slot) for slot in range(self.pool_size)))
+
+    async def connection(self, slot):
+        async with self._connect_locks[slot]:
+            connection = self._connections[slot]
+            if connection is None or connection.closed:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                connection = self._connections[slot] = IsoConnection(self, reader, writer)
+            return connection
+
+    async def close(self):
+        connections = [connection for connection in self._connections if connection is not None]
+        self._connections = [None] * self.pool_size
+        await asyncio.gather(*(connection.close() for connection in connections))
+
+    def message_key(self, message):
+        return tuple(message.field_data(field) for field in self.key_fields)
+
+    async def request(self, message, timeout=None):
+        """Send a request and wait for the response matching its key fields"""
+        data = message.build_iso()
+        # The key is read back from the encoded request, as the response will be
+        key = self.message_key(Iso8583(data, iso_spec=self.spec, lazy=True))
+        if key in self.pending:
+            raise ValueError("A request with key {0} is already in flight".format(key))
+
+        if self.tpdu is not None:
+            data = self.tpdu + data
+        data = encode_header(self.length_header, len(data)) + data
+
+        # registered before the first await, for concurrent requests to see the key as taken
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        connection = None
+
+        try:
+            connection = await self.connection(next(self._next))
+            connection.pending.add(key)
+            await connection.send(data)
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.timeout)
+        finally:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+            if connection is not None:
+                connection.pending.discard(key)
@@ -0,0 +1,693 @@
+import binascii
+import struct
+from array import array
+from collections import namedtuple
+from collections.abc import Mapping, MutableMapping
+
+from py8583.enums import DT, LT
+from py8583.errors import ParseError, SpecError, BuildError
+from py8583.numeric import bcd_to_str, str_to_bcd, bcd_to_int, int_to_bcd, ascii_to_int, int_to_ascii
+from py8583.ebcdic import EbcdicToLatin, LatinToEbcdic, ebcdic_to_str, str_to_ebcdic, ebcdic_to_int, int_to_ebcdic
+
+
+# The bitmap is kept as a single 128 bit integer, field n being bit (128 - n)
+SECONDARY_BIT = 1 << 127
+SECONDARY_WORD = (1 << 64) - 1
+DATA_FIELDS = SECONDARY_BIT - 1
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(value):
+        return bin(value).count('1')
+
+
+def field_bit(field):
+    return 1 << (128 - field)
+
+
+def bitmap_fields(bitmap):
+    """Yield the set fields of a bitmap in ascending order"""
+    while bitmap:
+        top = bitmap.bit_length()
+        yield 129 - top
+        bitmap ^= 1 << (top - 1)
+
+
+def read_bitmap(codecs, iso, p):
+    """Decode the primary and, when flagged, secondary bitmap into one integer"""
+    decode = codecs[1].decode
+
+    int_primary, p = decode(iso, p)
+    bitmap = int_primary << 64
+
+    if bitmap & SECONDARY_BIT:
+        int_secondary, p = decode(iso, p)
+        bitmap |= int_secondary
+
+    return bitmap, p
+
+
+# One compiled entry per slot of a spec: slot 0 is the mti, slot 1 the bitmap and
+# slots 2-128 the data fields. decode(iso, p) reads from any bytes-like object
+# (usually a memoryview) and returns (value, p), encode(value) returns the bytes
+# of the field, length prefix included.
+# For lazy parsing, scan(iso, p) only walks the length prefix and returns
+# (start, length, p), and load(iso, start, length) decodes the value later on.
+# nested is the spec of the subfields of a composite field, see CompositeField.
+# marks is the 256 byte translate() table of a character field, mapping the bytes its
+# content type allows to 0 and the others to 1, see ContentCheck. It is None for the
+# other fields.
+# prefix is the size in bytes of the length prefix of the field, its value starting that
+# many bytes after the position given to decode().
+FieldCodec = namedtuple('FieldCodec', ('field', 'data_type', 'len_type', 'len_data_type', 'content_type',
+                                       'max_length', 'decode', 'encode', 'scan', 'load', 'nested', 'marks', 'prefix'),
+                        defaults=(None, None, 0))
+
+
+_Letters = bytes(range(ord('A'), ord('Z') + 1)) + bytes(range(ord('a'), ord('z') + 1))
+_Digits = b'0123456789'
+# printable characters that are neither letters nor digits, space included
+_Specials = bytes(c for c in range(0x20, 0x7f) if c not in _Letters + _Digits)
+
+# content type -> characters allowed in its ASCII values. Alphabetic values are space
+# padded, so space is allowed in all of them. 'b' values of character data are hex text and
+# track 2 ('z') has the 0x30-0x3F code set, with 'D' as the separator.
+ContentCharacters = {
+    'a': _Letters + b' ',
+    'n': _Digits,
+    's': _Specials,
+    'an': _Letters + _Digits + b' ',
+    'as': _Letters + _Specials,
+    'ns': _Digits + _Specials,
+    'ans': _Letters + _Digits + _Specials,
+    'b': _Digits + b'ABCDEFabcdef',
+    'z': bytes(range(0x30, 0x40)) + b'D',
+}
+
+
+def _mark_table(allowed):
+    return bytes(0 if c in allowed else 1 for c in range(256))
+
+
+# (data type, content type) -> marks table, one shared table per content type and encoding
+ContentMarks = {}
+for _content_type, _allowed in ContentCharacters.items():
+    ContentMarks[(DT.ASCII, _content_type)] = _mark_table(_allowed)
+    ContentMarks[(DT.EBCDIC, _content_type)] = _mark_table(_allowed.translate(LatinToEbcdic))
+del _content_type, _allowed
+
+
+class ContentCheck(dict):
+    """marks table -> the message iso translated by it, for the strict parsing of its fields
+
+    The message is translated once per marks table in use, on first use, the raw value of a
+    field then being checked by a single find() over its span, see check().
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, iso):
+        self.data = iso if type(iso) is bytes else bytes(iso)
+
+    def __missing__(self, table):
+        marks = self[table] = self.data.translate(table)
+        return marks
+
+    def check(self, codec, start, end):
+        if codec.marks is not None and self[codec.marks].find(1, start, end) != -1:
+            raise self.error(codec, start, end)
+
+    def error(self, codec, start, end):
+        # the ParseError of a field whose raw value, data[start:end], has bytes its content type
+        # does not allow
+        invalid = bytes(c for c in self.data[start:end] if codec.marks[c])
+        return ParseError("F{0} has invalid characters for content type '{1}': {2!r}".format(
+            codec.field, codec.content_type, invalid[:8]))
+
+
+def _value_decoder(data_type, content_type):
+    if data_type == DT.ASCII:
+        if content_type == 'n':
+            def decode(iso, p, length):
+                return ascii_to_int(iso[p:p + length]), p + length
+        else:
+            def decode(iso, p, length):
+                return str(iso[p:p + length], 'latin'), p + length
+
+    elif data_type == DT.BCD:
+        if content_type == 'n':
+            def decode(iso, p, length):
+                size = (length + 1) // 2
+                return bcd_to_int(iso[p:p + size]), p + size
+        else:
+            def decode(iso, p, length):
+                size = (length + 1) // 2
+                return binascii.hexlify(iso[p:p + size]).decode('latin').upper(), p + size
+
+    elif data_type == DT.BIN:
+        def decode(iso, p, length):
+            return binascii.hexlify(iso[p:p + length]).decode('latin').upper(), p + length
+
+    elif data_type == DT.EBCDIC:
+        if content_type == 'n':
+            def decode(iso, p, length):
+                return ebcdic_to_int(iso[p:p + length]), p + length
+        else:
+            def decode(iso, p, length):
+                return ebcdic_to_str(iso[p:p + length]), p + length
+
+    else:
+        raise SpecError("Unsupported data type '{0}'".format(data_type))
+
+    if content_type == 'z':
+        raw_decode = decode
+
+        def decode(iso, p, length):
+            value, p = raw_decode(iso, p, length)
+            # in track2, replace d with = and remove trailing f
+            return value.replace("D", "=").replace("F", ""), p
+
+    return decode
+
+
+# (length type, length data type) -> size in bytes of the length prefix
+LengthSizes = {
+    (LT.LLVAR, DT.ASCII): 2, (LT.LLVAR, DT.BCD): 1, (LT.LLVAR, DT.EBCDIC): 2,
+    (LT.LLLVAR, DT.ASCII): 3, (LT.LLLVAR, DT.BCD): 2, (LT.LLLVAR, DT.EBCDIC): 3,
+}
+
+
+def _length_decoder(len_type, len_data_type):
+    if len_type == LT.LLVAR:
+        if len_data_type == DT.ASCII:
+            def decode(iso, p):
+                return ascii_to_int(iso[p:p + 2]), p + 2
+        elif len_data_type == DT.BCD:
+            def decode(iso, p):
+                return bcd_to_int(iso[p:p + 1]), p + 1
+        elif len_data_type == DT.EBCDIC:
+            def decode(iso, p):
+                return ebcdic_to_int(iso[p:p + 2]), p + 2
+        else:
+            decode = None
+
+    elif len_type == LT.LLLVAR:
+        if len_data_type == DT.ASCII:
+            def decode(iso, p):
+                b = iso[p:p + 3]
+                return (ascii_to_int(b) if b else 0), p + 3
+        elif len_data_type == DT.BCD:
+            def decode(iso, p):
+                return bcd_to_int(iso[p:p + 2]), p + 2
+        elif len_data_type == DT.EBCDIC:
+            def decode(iso, p):
+                b = iso[p:p + 3]
+                return (ebcdic_to_int(b) if b else 0), p + 3
+        else:
+            decode = None
+
+    else:
+        decode = None
+
+    if decode is None:
+        def decode(iso, p):
+            raise ParseError('Unsupported length data type')
+
+    return decode
+
+
+def _field_decoders(field, data_type, len_type, len_data_type, content_type, max_length):
+    if data_type in (DT.ASCII, DT.EBCDIC) and content_type == 'b':
+        max_length *= 2
+
+    empty = None if content_type == 'n' else ''
+    decode_value = _value_decoder(data_type, content_type)
+    bcd = data_type == DT.BCD
+
+    if len_type == LT.FIXED:
+        size = (max_length + 1) // 2 if bcd else max_length
+
+        if max_length == 0:
+            def decode(iso, p):
+                return empty, p
+        else:
+            def decode(iso, p):
+                return decode_value(iso, p, max_length)
+
+        def scan(iso, p):
+            return p, max_length, p + size
+
+    elif len_type == LT.LVAR:
+        def decode(iso, p):
+            return empty, p
+
+        def scan(iso, p):
+            return p, 0, p
+
+    else:
+        decode_length = _length_decoder(len_type, len_data_type)
+
+        def decode(iso, p):
+            length, p = decode_length(iso, p)
+
+            if length > max_length:
+                raise ParseError(f"F{field} is larger than maximum length ({length}>{max_length})")
+
+            # In case of zero length, don't try to parse the field itself, just continue
+            if length == 0:
+                return empty, p
+
+            return decode_value(iso, p, length)
+
+        def scan(iso, p):
+            length, p = decode_length(iso, p)
+
+            if length > max_length:
+                raise ParseError(f"F{field} is larger than maximum length ({length}>{max_length})")
+
+            return p, length, p + ((length + 1) // 2 if bcd else length)
+
+    def load(iso, start, length):
+        if length == 0:
+            return empty
+        return decode_value(iso, start, length)[0]
+
+    return decode, scan, load
+
+
+def _data_encoder(data_type):
+    if data_type == DT.ASCII:
+        return lambda data: data.encode('latin')
+    elif data_type == DT.BCD:
+        return str_to_bcd
+    elif data_type == DT.BIN:
+        return binascii.unhexlify
+    elif data_type == DT.EBCDIC:
+        return str_to_ebcdic
+
+    raise SpecError("Unsupported data type '{0}'".format(data_type))
+
+
+# decimal encoders of numbers, taking the value and the number of digits to pad to
+_int_encoders = {DT.ASCII: int_to_ascii, DT.BCD: int_to_bcd, DT.EBCDIC: int_to_ebcdic}
+
+
+def _length_encoder(field, len_type, len_data_type):
+    digits = {LT.LVAR: 1, LT.LLVAR: 2, LT.LLLVAR: 3}[len_type]
+    if len_data_type in _int_encoders:
+        encode_int = _int_encoders[len_data_type]
+
+        def encode_length(length):
+            return encode_int(length, digits)
+    elif len_data_type is not None:
+        length_formatter = "0{0}d".format(digits)
+        encode_data_length = _data_encoder(len_data_type)
+
+        def encode_length(length):
+            return encode_data_length(format(length, length_formatter))
+    else:
+        def encode_length(length):
+            raise SpecError("Cannot build F{0}: Unsupported length data type".format(field))
+
+    return encode_length
+
+
+def _field_encoder(field, data_type, len_type, len_data_type, content_type, max_length):
+    encode_data = _data_encoder(data_type)
+
+    if len_type == LT.FIXED:
+        if content_type == 'n' and data_type in _int_encoders:
+            encode_int = _int_encoders[data_type]
+
+            def encode(value):
+                return encode_int(value, max_length)
+
+            return encode
+
+        if content_type == 'n':
+            formatter = "0{0}d".format(max_length)
+        elif 'a' in content_type or 'n' in content_type or 's' in content_type:
+            formatter = " >{0}".format(max_length)
+        else:
+            formatter = ""
+
+        def encode(value):
+            return encode_data(format(value, formatter))
+
+        return encode
+
+    encode_length = _length_encoder(field, len_type, len_data_type)
+
+    track2 = content_type == 'z' and data_type == DT.BIN
+
+    def encode(value):
+        data = format(value, "")
+
+        if track2:
+            if len(data) % 2 == 1:
+                data = data + 'F'
+            data = data.replace("=", "D")
+
+        length = len(data)
+        if data_type == DT.BIN:
+            length //= 2
+
+        if length > max_length:
+            raise BuildError("Cannot Build F{0}: field Length larger than specification".format(field))
+
+        return encode_length(length) + encode_data(data)
+
+    return encode
+
+
+def _mti_codec(data_type):
+    if data_type == DT.BCD:
+        def decode(iso, p):
+            return bcd_to_str(iso[p:p + 2]), p + 2
+
+        encode = str_to_bcd
+    elif data_type == DT.ASCII:
+        def decode(iso, p):
+            return str(iso[p:p + 4], 'latin'), p + 4
+
+        def encode(mti):
+            return mti.encode('latin')
+    elif data_type == DT.EBCDIC:
+        def decode(iso, p):
+            return ebcdic_to_str(iso[p:p + 4]), p + 4
+
+        encode = str_to_ebcdic
+    else:
+        raise SpecError("Unsupported mti data type '{0}'".format(data_type))
+
+    return FieldCodec('mti', data_type, LT.FIXED, None, 'n', 4, decode, encode, None, None)
+
+
+def _bitmap_codec(data_type):
+    # A bitmap word is one 64 bit half of the bitmap, as an integer
+    if data_type == DT.BIN:
+        def decode(iso, p):
+            return struct.unpack_from("!Q", iso, p)[0], p + 8
+
+        def encode(word):
+            return struct.pack("!Q", word)
+    elif data_type == DT.ASCII:
+        def decode(iso, p):
+            return struct.unpack("!Q", binascii.unhexlify(iso[p:p + 16]))[0], p + 16
+
+        def encode(word):
+            return binascii.hexlify(struct.pack("!Q", word)).upper()
+    elif data_type == DT.EBCDIC:
+        def decode(iso, p):
+            return struct.unpack("!Q", binascii.unhexlify(bytes(iso[p:p + 16]).translate(EbcdicToLatin)))[0], p + 16
+
+        def encode(word):
+            return str_to_ebcdic(binascii.hexlify(struct.pack("!Q", word)).decode('latin').upper())
+    else:
+        raise SpecError("Unsupported bitmap data type '{0}'".format(data_type))
+
+    return FieldCodec(1, data_type, LT.FIXED, None, 'b', 8, decode, encode, None, None)
+
+
+def _missing_codec(field):
+    def decode(iso, p):
+        raise SpecError("Cannot parse F{0}: Incomplete field specification".format(field))
+
+    def encode(value):
+        raise SpecError("Cannot build F{0}: Incomplete field specification".format(field))
+
+    def load(iso, start, length):
+        return decode(iso, start)
+
+    return FieldCodec(field, None, None, None, None, None, decode, encode, decode, load)
+
+
+class CompositeField(MutableMapping):
+    """Value of a composite field (e.g. field 127), subfield -> value
+
+    The field holds its own bitmap followed by subfields, laid out by a nested spec (see
+    IsoSpec.nested_spec), the bitmap being slot 1 of that spec. The bitmap is read and the
+    subfields scanned on first access only, and each subfield is decoded when it is read.
+    encode() copies the subfields that were not changed as they are.
+    """
+
+    __slots__ = ('_codecs', '_data', '_index', '_values')
+
+    def __init__(self, spec, data=b'', values=None):
+        self._codecs = spec.compile()
+        self._data = data
+        # subfield -> (start, value start, length, end) of the unchanged subfields in data,
+        # None until the first access
+        self._index = None if len(data) else {}
+        # decoded and changed subfield values
+        self._values = {}
+        if values:
+            self.update(values)
+
+    def _subfields(self):
+        if self._index is None:
+            codecs, data = self._codecs, self._data
+            index = {}
+            bitmap, p = read_bitmap(codecs, data, 0)
+            for field in bitmap_fields(bitmap & DATA_FIELDS):
+                start = p
+                value_start, length, p = codecs[field].scan(data, p)
+                if p > len(data):
+                    raise ParseError("Subfield {0} runs past the end of the field ({1}>{2})".format(
+                        field, p, len(data)))
+                index[field] = (start, value_start, length, p)
+            self._index = index
+        return self._index
+
+    def __getitem__(self, field):
+        try:
+            return self._values[field]
+        except KeyError:
+            pass
+
+        _, start, length, _ = self._subfields()[field]
+        try:
+            value = self._codecs[field].load(self._data, start, length)
+        except (ParseError, SpecError):
+            raise
+        except Exception as ex:
+            raise ParseError("Cannot parse subfield {0}: {1}".format(field, ex)) from None
+        self._values[field] = value
+        return value
+
+    def __setitem__(self, field, value):
+        if field not in _SUBFIELD_NUMBERS:
+            raise KeyError(field)
+        self._subfields().pop(field, None)
+        self._values[field] = value
+
+    def __delitem__(self, field):
+        if field not in self:
+            raise KeyError(field)
+        self._index.pop(field, None)
+        self._values.pop(field, None)
+
+    def __contains__(self, field):
+        return field in self._values or field in self._subfields()
+
+    def __iter__(self):
+        return iter(sorted(set(self._subfields()).union(self._values)))
+
+    def __len__(self):
+        return len(set(self._subfields()).union(self._values))
+
+    def __repr__(self):
+        return "CompositeField({0!r})".format(dict(self.items()))
+
+    def __bytes__(self):
+        return self.encode()
+
+    def encode(self):
+        """The content of the field: bitmap and subfields"""
+        codecs, data, index = self._codecs, self._data, self._subfields()
+
+        bitmap = 0
+        for field in self:
+            bitmap |= field_bit(field)
+        if bitmap & SECONDARY_WORD:
+            bitmap |= SECONDARY_BIT
+
+        parts = [codecs[1].encode(bitmap >> 64)]
+        if bitmap & SECONDARY_BIT:
+            parts.append(codecs[1].encode(bitmap & SECONDARY_WORD))
+
+        for field in self:
+            if field in index:
+                start, _, _, end = index[field]
+                parts.append(data[start:end])
+            else:
+                try:
+                    parts.append(codecs[field].encode(self._values[field]))
+                except Exception as ex:
+                    raise type(ex)('Error building subfield {}: '.format(field) + repr(ex)) from None
+
+        return b''.join(parts)
+
+
+_SUBFIELD_NUMBERS = range(2, 129)
+
+
+def composite_bytes(nested, value):
+    """Content of a composite field given as a CompositeField, a mapping of subfield values or raw bytes"""
+    if isinstance(value, CompositeField):
+        return value.encode()
+    elif isinstance(value, Mapping):
+        return CompositeField(nested, values=value).encode()
+    return bytes(value)
+
+
+def _nested_codec(field, nested, data_type, len_type, len_data_type, content_type, max_length):
+    # The content of a composite field is counted in bytes whatever its data type
+    if data_type == DT.BCD or len_type == LT.LVAR:
+        raise SpecError("F{0} cannot be a composite field: Unsupported data or length type".format(field))
+
+    if len_type == LT.FIXED:
+        def scan(iso, p):
+            return p, max_length, p + max_length
+
+        def encode_length(length):
+            if length != max_length:
+                raise BuildError("Cannot Build F{0}: field Length different from specification".format(field))
+            return b''
+    else:
+        decode_length = _length_decoder(len_type, len_data_type)
+
+        def scan(iso, p):
+            length, p = decode_length(iso, p)
+
+            if length > max_length:
+                raise ParseError(f"F{field} is larger than maximum length ({length}>{max_length})")
+
+            return p, length, p + length
+
+        encode_data_length = _length_encoder(field, len_type, len_data_type)
+
+        def encode_length(length):
+            if length > max_length:
+                raise BuildError("Cannot Build F{0}: field Length larger than specification".format(field))
+            return encode_data_length(length)
+
+    def load(iso, start, length):
+        # a view of the message, read by lazy messages, which keep the message
+        return CompositeField(nested, iso[start:start + length])
+
+    def decode(iso, p):
+        start, length, p = scan(iso, p)
+        if p > len(iso):
+            raise ParseError("F{0} is truncated".format(field))
+        # a copy, the message being let go after an eager parse
+        return CompositeField(nested, bytes(iso[start:start + length])), p
+
+    def encode(value):
+        data = composite_bytes(nested, value)
+        return encode_length(len(data)) + data
+
+    return FieldCodec(field, data_type, len_type, len_data_type, content_type, max_length, decode, encode, scan, load,
+                      nested)
+
+
+def field_codec(spec, field):
+    try:
+        data_type = spec.data_type(field)
+        len_type = spec.length_type(field)
+        content_type = spec.content_type(field)
+        max_length = spec.max_length(field)
+    except KeyError:
+        return _missing_codec(field)
+
+    len_data_type = None
+    if len_type != LT.FIXED:
+        try:
+            len_data_type = spec.length_data_type(field)
+        except KeyError:
+            pass
+
+    nested = spec.nested_spec(field)
+    if nested is not None:
+        return _nested_codec(field, nested, data_type, len_type, len_data_type, content_type, max_length)
+
+    decode, scan, load = _field_decoders(field, data_type, len_type, len_data_type, content_type, max_length)
+    encode = _field_encoder(field, data_type, len_type, len_data_type, content_type, max_length)
+    marks = ContentMarks.get((data_type, content_type))
+    prefix = LengthSizes.get((len_type, len_data_type), 0)
+
+    return FieldCodec(field, data_type, len_type, len_data_type, content_type, max_length, decode, encode, scan, load,
+                      None, marks, prefix)
+
+
+def compile_spec(spec):
+    """Build the 129 slot codec table of a spec, see FieldCodec"""
+    table = []
+    for field, make_codec in (('mti', _mti_codec), (1, _bitmap_codec)):
+        try:
+            table.append(make_codec(spec.data_type(field)))
+        except KeyError:
+            table.append(_missing_codec(field))
+
+    table.extend(field_codec(spec, field) for field in range(2, 129))
+    return tuple(table)
+
+
+# Most bitmaps whose layout is kept by a FieldLayouts
+MaxLayouts = 1024
+
+# The data fields of a bitmap laid out for messages whose data fields start at offset start.
+# fixed holds (field, start, length, end) for the leading fields that have a fixed size, whose
+# offsets are known without reading the message, up to offset end. index holds their (start,
+# length) pairs and indexed their bits, as kept by lazy messages. steps holds (bit, scan, length,
+# size) for the fields after them: scan is None for the fixed size ones, which start where the
+# previous field ends, and the scan() of the codec for the others. fields has the bits of all
+# the data fields, the bitmap being kept as given.
+FieldLayout = namedtuple('FieldLayout', ('bitmap', 'fields', 'start', 'end', 'fixed', 'index', 'indexed', 'steps'))
+
+
+def field_layout(codecs, bitmap, p):
+    start = p
+    fixed, steps = [], []
+    indexed = 0
+
+    for field in bitmap_fields(bitmap & DATA_FIELDS):
+        codec = codecs[field]
+        if codec.len_type not in (LT.FIXED, LT.LVAR):
+            steps.append((field_bit(field), codec.scan, 0, 0))
+        elif steps:
+            _, length, size = codec.scan(None, 0)
+            steps.append((field_bit(field), None, length, size))
+        else:
+            field_start, length, p = codec.scan(None, p)
+            fixed.append((field, field_start, length, p))
+            indexed |= field_bit(field)
+
+    index = array('H' if p <= 0xFFFF else 'I')
+    for _, field_start, length, _ in fixed:
+        index.append(field_start)
+        index.append(length)
+
+    return FieldLayout(bitmap, bitmap & DATA_FIELDS, start, p, tuple(fixed), index, indexed, tuple(steps))
+
+
+class FieldLayouts(dict):
+    """bitmap -> field_layout() of its data fields, for the codec table codecs
+
+    Messages of the same bitmap share the offsets of their leading fixed size fields, and the
+    bitmap integers of the layout. Up to MaxLayouts bitmaps are kept, the others being laid out
+    again on each use.
+    """
+    __slots__ = ('codecs',)
+
+    def __init__(self, codecs):
+        self.codecs = codecs
+
+    def layout(self, bitmap, p):
+        layout = self.get(bitmap)
+        if layout is None or layout.start != p:
+            layout = field_layout(self.codecs, bitmap, p)
+            if len(self) < MaxLayouts:
+                self[bitmap] = layout
+        return layout
@@ -0,0 +1,244 @@
+import binascii
+
+from py8583.codec import field_bit
+from py8583.enums import DT, LT
+from py8583.errors import ParseError, SpecError, BuildError
+from py8583.numeric import bcd_to_int, str_to_bcd, int_to_bcd, ascii_to_int, int_to_ascii
+from py8583.ebcdic import EbcdicToLatin, LatinToEbcdic, ebcdic_to_int, int_to_ebcdic
+
+
+# Fields are tested a group at a time before testing them one by one
+GroupSize = 8
+
+# File name of the generated code, in tracebacks
+CodeName = '<py8583 generated codec>'
+
+
+class GeneratedCodec:
+    """Parse and build functions specialized for one spec
+
+    parse_fields(iso, p, bitmap, values) decodes the data fields flagged in bitmap into
+    the values dict and returns the end offset; on error the fields decoded so far are
+    left in values. build_fields(bitmap, values, parts) appends the encoded data fields
+    to the parts list. Both produce exactly what the compiled codec table does, with the
+    per-field decisions resolved at generation time. code is the source already compiled,
+    e.g. loaded from a cache.
+    """
+
+    def __init__(self, codecs, source, code=None):
+        self.codecs = codecs
+        self.source = source
+
+        namespace = {
+            'binascii': binascii, 'bcd_to_int': bcd_to_int, 'str_to_bcd': str_to_bcd, 'int_to_bcd': int_to_bcd,
+            'ascii_to_int': ascii_to_int, 'int_to_ascii': int_to_ascii, 'ebcdic_to_int': ebcdic_to_int,
+            'int_to_ebcdic': int_to_ebcdic, 'ebcdic_to_latin': EbcdicToLatin, 'latin_to_ebcdic': LatinToEbcdic,
+            'ParseError': ParseError, 'SpecError': SpecError, 'BuildError': BuildError,
+        }
+        for codec in codecs[2:]:
+            namespace['decode_{0}'.format(codec.field)] = codec.decode
+            namespace['encode_{0}'.format(codec.field)] = codec.encode
+
+        if code is None:
+            code = compile(source, CodeName, 'exec')
+        exec(code, namespace)
+        self.parse_fields = namespace['parse_fields']
+        self.build_fields = namespace['build_fields']
+
+
+def _group_masks():
+    for first in range(2, 129, GroupSize):
+        fields = range(first, min(first + GroupSize, 129))
+        mask = 0
+        for field in fields:
+            mask |= field_bit(field)
+        yield mask, fields
+
+
+def _value_lines(codec, length):
+    # Statements decoding a value of `length` (an expression) at p into value
+    data_type, content_type = codec.data_type, codec.content_type
+
+    if data_type == DT.ASCII:
+        if content_type == 'n':
+            lines = ["value = ascii_to_int(iso[p:p + {0}])".format(length)]
+        else:
+            lines = ["value = str(iso[p:p + {0}], 'latin')".format(length)]
+        lines.append("p += {0}".format(length))
+    elif data_type == DT.BCD:
+        if isinstance(length, int):
+            lines, size = [], (length + 1) // 2
+        else:
+            lines, size = ["size = ({0} + 1) // 2".format(length)], 'size'
+        if content_type == 'n':
+            lines.append("value = bcd_to_int(iso[p:p + {0}])".format(size))
+        else:
+            lines.append("value = binascii.hexlify(iso[p:p + {0}]).decode('latin').upper()".format(size))
+        lines.append("p += {0}".format(size))
+    elif data_type == DT.BIN:
+        lines = ["value = binascii.hexlify(iso[p:p + {0}]).decode('latin').upper()".format(length),
+                 "p += {0}".format(length)]
+    elif data_type == DT.EBCDIC:
+        if content_type == 'n':
+            lines = ["value = ebcdic_to_int(iso[p:p + {0}])".format(length)]
+        else:
+            lines = ["value = str(bytes(iso[p:p + {0}]).translate(ebcdic_to_latin), 'latin')".format(length)]
+        lines.append("p += {0}".format(length))
+    else:
+        return None
+
+    if content_type == 'z':
+        lines.append("value = value.replace('D', '=').replace('F', '')")
+    return lines
+
+
+def _length_lines(codec):
+    if codec.len_type == LT.LLVAR:
+        if codec.len_data_type == DT.ASCII:
+            return ["length = ascii_to_int(iso[p:p + 2])", "p += 2"]
+        elif codec.len_data_type == DT.BCD:
+            return ["length = bcd_to_int(iso[p:p + 1])", "p += 1"]
+        elif codec.len_data_type == DT.EBCDIC:
+            return ["length = ebcdic_to_int(iso[p:p + 2])", "p += 2"]
+    elif codec.len_type == LT.LLLVAR:
+        if codec.len_data_type == DT.ASCII:
+            return ["b = iso[p:p + 3]", "length = ascii_to_int(b) if b else 0", "p += 3"]
+        elif codec.len_data_type == DT.BCD:
+            return ["length = bcd_to_int(iso[p:p + 2])", "p += 2"]
+        elif codec.len_data_type == DT.EBCDIC:
+            return ["b = iso[p:p + 3]", "length = ebcdic_to_int(b) if b else 0", "p += 3"]
+    return None
+
+
+def _parse_lines(codec):
+    field = codec.field
+    if codec.data_type is None or codec.nested is not None:
+        return ["values[{0}], p = decode_{0}(iso, p)".format(field)]
+
+    empty = repr(None if codec.content_type == 'n' else '')
+    max_length = codec.max_length
+    if codec.data_type in (DT.ASCII, DT.EBCDIC) and codec.content_type == 'b':
+        max_length *= 2
+
+    if codec.len_type == LT.FIXED:
+        if max_length == 0:
+            return ["values[{0}] = {1}".format(field, empty)]
+        lines = _value_lines(codec, max_length)
+        if lines is None:
+            return ["values[{0}], p = decode_{0}(iso, p)".format(field)]
+        return lines + ["values[{0}] = value".format(field)]
+
+    if codec.len_type == LT.LVAR:
+        return ["values[{0}] = {1}".format(field, empty)]
+
+    length_lines = _length_lines(codec)
+    value_lines = _value_lines(codec, 'length')
+    if length_lines is None or value_lines is None:
+        return ["values[{0}], p = decode_{0}(iso, p)".format(field)]
+
+    return length_lines + [
+        "if length > {0}:".format(max_length),
+        "    raise ParseError(f'F{0} is larger than maximum length ({{length}}>{1})')".format(field, max_length),
+        "if length == 0:",
+        "    values[{0}] = {1}".format(field, empty),
+        "else:",
+    ] + ["    " + line for line in value_lines] + ["    values[{0}] = value".format(field)]
+
+
+def _data_expression(data_type, data):
+    if data_type == DT.ASCII:
+        return "{0}.encode('latin')".format(data)
+    elif data_type == DT.BCD:
+        return "str_to_bcd({0})".format(data)
+    elif data_type == DT.BIN:
+        return "binascii.unhexlify({0})".format(data)
+    elif data_type == DT.EBCDIC:
+        return "{0}.encode('latin').translate(latin_to_ebcdic)".format(data)
+    return None
+
+
+def _int_expression(data_type, value, digits):
+    if data_type == DT.ASCII:
+        return "int_to_ascii({0}, {1})".format(value, digits)
+    elif data_type == DT.BCD:
+        return "int_to_bcd({0}, {1})".format(value, digits)
+    elif data_type == DT.EBCDIC:
+        return "int_to_ebcdic({0}, {1})".format(value, digits)
+    return None
+
+
+def _build_lines(codec):
+    field = codec.field
+    fallback = ["parts.append(encode_{0}(values[{0}]))".format(field)]
+    data_type, content_type = codec.data_type, codec.content_type
+
+    if data_type is None or codec.nested is not None or _data_expression(data_type, 'data') is None:
+        return fallback
+
+    if codec.len_type == LT.FIXED:
+        if content_type == 'n' and _int_expression(data_type, 'value', 0) is not None:
+            return ["parts.append({0})".format(
+                _int_expression(data_type, "values[{0}]".format(field), codec.max_length))]
+
+        if content_type == 'n':
+            formatter = "0{0}d".format(codec.max_length)
+        elif 'a' in content_type or 'n' in content_type or 's' in content_type:
+            formatter = " >{0}".format(codec.max_length)
+        else:
+            formatter = ""
+        return ["parts.append({0})".format(
+            _data_expression(data_type, "format(values[{0}], {1!r})".format(field, formatter)))]
+
+    digits = {LT.LVAR: 1, LT.LLVAR: 2, LT.LLLVAR: 3}[codec.len_type]
+    length_expression = _int_expression(codec.len_data_type, 'length', digits)
+    if length_expression is None and codec.len_data_type is not None:
+        length_expression = _data_expression(codec.len_data_type, "format(length, '0{0}d')".format(digits))
+    if length_expression is None:
+        return fallback
+
+    lines = ["data = format(values[{0}], '')".format(field)]
+    if content_type == 'z' and data_type == DT.BIN:
+        lines += ["if len(data) % 2 == 1:",
+                  "    data = data + 'F'",
+                  "data = data.replace('=', 'D')"]
+    lines.append("length = len(data) // 2" if data_type == DT.BIN else "length = len(data)")
+    lines += [
+        "if length > {0}:".format(codec.max_length),
+        "    raise BuildError('Cannot Build F{0}: field Length larger than specification')".format(field),
+        "parts.append({0})".format(length_expression),
+        "parts.append({0})".format(_data_expression(data_type, 'data')),
+    ]
+    return lines
+
+
+def _emit(lines, make_lines, track_field=False):
+    for mask, fields in _group_masks():
+        lines.append("    if bitmap & {0:#x}:".format(mask))
+        for field in fields:
+            lines.append("        if bitmap & {0:#x}:".format(field_bit(field)))
+            if track_field:
+                lines.append("            field = {0}".format(field))
+            lines.extend("            " + line for line in make_lines(field))
+
+
+def generate_source(codecs):
+    lines = ["def parse_fields(iso, p, bitmap, values):"]
+    _emit(lines, lambda field: _parse_lines(codecs[field]))
+    lines += ["    return p", "", ""]
+
+    lines.append("def build_fields(bitmap, values, parts):")
+    lines.append("    field = None")
+    lines.append("    try:")
+    body = []
+    _emit(body, lambda field: _build_lines(codecs[field]), track_field=True)
+    lines.extend("    " + line for line in body)
+    lines += ["    except Exception as ex:",
+              "        raise type(ex)('Error building F{}: '.format(field) + repr(ex)) from None",
+              ""]
+
+    return "\n".join(lines)
+
+
+def generate_spec(spec):
+    codecs = spec.compile()
+    return GeneratedCodec(codecs, generate_source(codecs))
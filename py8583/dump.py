@@ -0,0 +1,59 @@
+# Printable ASCII (0x20-0x7e) is kept in hex dumps, everything else shows as '.'
+PrintableTable = bytes(c if 0x20 <= c < 0x7f else ord('.') for c in range(256))
+
+
+def hex_dump(data, size=16):
+    lines = []
+    for i in range(0, len(data), size):
+        line = bytes(data[i:i + size])
+        lines.append("{0:<{1}} | {2}".format(line.hex(' '), size * 3 - 1, line.translate(PrintableTable).decode('ascii')))
+    return "\n".join(lines)
+
+
+class HexDump:
+    # Hex dump formatted when logged only, to pass as a logging argument
+
+    __slots__ = ('data', 'size')
+
+    def __init__(self, data, size=16):
+        self.data = data
+        self.size = size
+
+    def __str__(self):
+        return hex_dump(self.data, self.size)
+
+
+def mask_pan(pan):
+    # PCI DSS display: first 6 and last 4 digits at most
+    pan = str(pan)
+    # fewer digits are left out of short numbers, so that most of them stays masked
+    head = min(6, max(len(pan) - 10, 0))
+    tail = min(4, len(pan) // 4)
+    return pan[:head] + '*' * (len(pan) - head - tail) + pan[len(pan) - tail:]
+
+
+def mask_track2(track):
+    pan, separator, rest = str(track).partition('=')
+    return mask_pan(pan) + separator + '*' * len(rest)
+
+
+def mask_all(value):
+    return '*' * len(str(value))
+
+
+# field -> masking function of the sensitive fields
+Masks = {
+    2: mask_pan,  # PAN
+    34: mask_pan,  # extended PAN
+    35: mask_track2,
+    36: mask_all,  # track 3
+    45: mask_all,  # track 1
+    52: mask_all,  # PIN data
+}
+
+
+def mask_value(field, value, masks=Masks):
+    mask = masks.get(field)
+    if mask is None or value is None:
+        return value
+    return mask(value)
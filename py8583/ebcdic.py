@@ -0,0 +1,25 @@
+from py8583.numeric import ascii_to_int, int_to_ascii
+
+
+# EBCDIC code page of the EBCDIC data type. cp037 covers all of latin-1, so text is
+# transcoded with a byte for byte bytes.translate() pass instead of a codec.
+CodePage = 'cp037'
+
+EbcdicToLatin = bytes(range(256)).decode(CodePage).encode('latin')
+LatinToEbcdic = bytes.maketrans(EbcdicToLatin, bytes(range(256)))
+
+
+def ebcdic_to_str(ebcdic):
+    return str(bytes(ebcdic).translate(EbcdicToLatin), 'latin')
+
+
+def str_to_ebcdic(string):
+    return string.encode('latin').translate(LatinToEbcdic)
+
+
+def ebcdic_to_int(ebcdic):
+    return ascii_to_int(bytes(ebcdic).translate(EbcdicToLatin))
+
+
+def int_to_ebcdic(integer, length=0):
+    return int_to_ascii(integer, length).translate(LatinToEbcdic)
@@ -6,6 +6,7 @@ class DT(IntEnum):
     BCD = 1
     ASCII = 2
     BIN = 3
+    EBCDIC = 4
 
 
 # Length Type enumeration
@@ -16,6 +17,13 @@ class LT(IntEnum):
     LLLVAR = 3
 
 
+# Length header (message framing) enumeration
+class LH(IntEnum):
+    NONE = 0
+    BIN2 = 1  # 2 byte big endian binary length
+    ASCII4 = 2  # 4 digit ASCII decimal length
+
+
 class MsgVersion(IntEnum):
     ISO1987 = 0
     ISO1993 = 1
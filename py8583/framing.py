@@ -0,0 +1,146 @@
+import socket
+import struct
+
+from py8583.enums import LH
+from py8583.errors import ParseError, BuildError
+
+
+HeaderSizes = {LH.NONE: 0, LH.BIN2: 2, LH.ASCII4: 4}
+
+# Transport Protocol Data Unit: protocol id, destination and source address
+TPDU_SIZE = 5
+
+
+def header_size(length_header):
+    return HeaderSizes[length_header]
+
+
+def encode_header(length_header, length):
+    if length_header == LH.NONE:
+        return b''
+    elif length_header == LH.BIN2:
+        if length > 0xFFFF:
+            raise BuildError("Message length {0} does not fit a 2 byte header".format(length))
+        return struct.pack("!H", length)
+    elif length_header == LH.ASCII4:
+        if length > 9999:
+            raise BuildError("Message length {0} does not fit a 4 digit header".format(length))
+        return "{0:04d}".format(length).encode('latin')
+
+    raise BuildError("Unsupported length header '{0}'".format(length_header))
+
+
+def decode_header(length_header, data, p=0):
+    if len(data) - p < HeaderSizes.get(length_header, 0):
+        raise ParseError("Truncated length header")
+
+    if length_header == LH.BIN2:
+        return struct.unpack_from("!H", data, p)[0]
+    elif length_header == LH.ASCII4:
+        digits = bytes(data[p:p + 4])
+        if not digits.isdigit():
+            raise ParseError("Invalid length header: [{0}]".format(digits.decode('latin')))
+        return int(digits)
+
+    raise ParseError("Unsupported length header '{0}'".format(length_header))
+
+
+def frame_offsets(data, length_header, p=0, end=None):
+    """Yield the (start, end) offsets of the messages of a buffer of length prefixed frames"""
+    size = header_size(length_header)
+    if size == 0:
+        raise ValueError("Frames can only be split on a length header")
+
+    end = len(data) if end is None else end
+    while p < end:
+        length = decode_header(length_header, data, p)
+        p += size
+        if p + length > end:
+            raise ParseError("Truncated frame at offset {0}: {1} bytes expected, {2} available".format(
+                p - size, length, end - p))
+        yield p, p + length
+        p += length
+
+
+def iter_frames(data, length_header):
+    view = memoryview(data)
+    for start, end in frame_offsets(view, length_header):
+        yield view[start:end]
+
+
+def read_frames(source, length_header=LH.BIN2, tpdu=False):
+    """Yield the messages of a stream of length prefixed frames
+
+    source is a bytes-like object (an mmap included), a socket or a binary file object.
+    Buffers are walked in place and yield memoryview slices of the source; sockets and
+    files are read frame by frame and yield bytes, without ever reading ahead more than
+    the underlying buffered reader does.
+    With tpdu, each frame starts with a TPDU and (tpdu, message) pairs are yielded.
+    """
+    if isinstance(source, socket.socket):
+        return _socket_frames(source, length_header, tpdu)
+
+    try:
+        view = memoryview(source)
+    except TypeError:
+        return _stream_frames(source, length_header, tpdu)
+
+    return _buffer_frames(view, length_header, tpdu)
+
+
+def _socket_frames(sock, length_header, tpdu):
+    # the file object is closed with the generator, the socket is left to the caller
+    with sock.makefile('rb') as stream:
+        yield from _stream_frames(stream, length_header, tpdu)
+
+
+def _split_tpdu(frame, p):
+    if len(frame) < TPDU_SIZE:
+        raise ParseError("Frame at offset {0} is too short for a TPDU".format(p))
+    return frame[:TPDU_SIZE], frame[TPDU_SIZE:]
+
+
+def _buffer_frames(view, length_header, tpdu):
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+
+    for start, end in frame_offsets(view, length_header):
+        if tpdu:
+            yield _split_tpdu(view[start:end], start)
+        else:
+            yield view[start:end]
+
+
+def _read_exactly(stream, size, p):
+    data = b''
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            raise ParseError("Truncated frame at offset {0}: {1} bytes expected, {2} available".format(
+                p, size, len(data)))
+        data += more
+    return data
+
+
+def _stream_frames(stream, length_header, tpdu):
+    size = header_size(length_header)
+    if size == 0:
+        raise ValueError("Frames can only be split on a length header")
+
+    p = 0
+    while True:
+        header = stream.read(size)
+        if not header:
+            return
+        if len(header) < size:
+            header += _read_exactly(stream, size - len(header), p)
+
+        length = decode_header(length_header, header)
+        frame = _read_exactly(stream, length, p + size) if length else b''
+
+        if tpdu:
+            yield _split_tpdu(frame, p)
+        else:
+            yield frame
+
+        p += size + length
@@ -0,0 +1,144 @@
+import bisect
+
+from py8583.py8583 import valid_mti
+
+
+# Upper bounds of the field time histogram buckets, in seconds
+DefaultBuckets = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DefaultBuckets):
+        self.buckets = buckets
+        # one count per bucket, the last one for the values above all the bounds
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        # (upper bound, observations up to it) pairs, as exported
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class IsoMetrics:
+    """In-process counters and histograms of the messages parsed and built
+
+    Pass an instance as the metrics argument of Iso8583 (or IsoServer/IsoClient) to record
+    the time spent on each field, messages per mti, bytes and errors per field, for both
+    directions ('parse' and 'build'). Fields parsed lazily are timed on their scan only.
+    Updates are not locked: use one instance per thread or event loop.
+    """
+
+    def __init__(self, prefix='py8583', buckets=DefaultBuckets):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        # (direction, mti) -> count
+        self.messages = {}
+        # direction -> count
+        self.bytes = {'parse': 0, 'build': 0}
+        # (direction, field) -> count, field being 'mti', 'bitmap' or a field number
+        self.errors = {}
+        # (direction, field) -> Histogram of the field time
+        self.field_times = {}
+
+    def observe_field(self, direction, field, seconds):
+        histogram = self.field_times.get((direction, field))
+        if histogram is None:
+            histogram = self.field_times[(direction, field)] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def count_message(self, direction, mti, size):
+        key = (direction, mti)
+        count = self.messages.get(key)
+        if count is None:
+            # mtis of no ISO 8583 version, class, function and origin, let through by non strict
+            # parses, are counted together for the label values to stay a bounded set
+            key = (direction, mti if _known_mti(mti) else 'invalid')
+            count = self.messages.get(key, 0)
+        self.messages[key] = count + 1
+        self.bytes[direction] += size
+
+    def count_error(self, direction, field):
+        key = (direction, field)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def collect(self):
+        """Yield the (name, labels, value) samples of all the metrics"""
+        prefix = self.prefix
+        for (direction, mti), count in sorted(self.messages.items(), key=str):
+            yield prefix + '_messages_total', {'direction': direction, 'mti': mti}, count
+        for direction, count in sorted(self.bytes.items()):
+            yield prefix + '_bytes_total', {'direction': direction}, count
+        for (direction, field), count in sorted(self.errors.items(), key=str):
+            yield prefix + '_errors_total', {'direction': direction, 'field': str(field)}, count
+
+        for (direction, field), histogram in sorted(self.field_times.items(), key=str):
+            labels = {'direction': direction, 'field': str(field)}
+            for bound, count in histogram.cumulative():
+                yield prefix + '_field_seconds_bucket', dict(labels, le=_format_value(bound)), count
+            yield prefix + '_field_seconds_sum', labels, histogram.sum
+            yield prefix + '_field_seconds_count', labels, histogram.count
+
+    def export(self, callback):
+        """Call callback(name, labels, value) for each sample"""
+        for name, labels, value in self.collect():
+            callback(name, labels, value)
+
+    def prometheus(self):
+        """The metrics in the Prometheus text exposition format"""
+        prefix = self.prefix
+        lines = []
+        described = set()
+        for name, labels, value in self.collect():
+            # the samples of a histogram are described once, under its own name
+            family = prefix + '_field_seconds' if name.startswith(prefix + '_field_seconds') else name
+
+            if family not in described:
+                described.add(family)
+                help_text, kind = _Families[family[len(prefix) + 1:]]
+                lines.append('# HELP {0} {1}'.format(family, help_text))
+                lines.append('# TYPE {0} {1}'.format(family, kind))
+
+            label_text = ','.join('{0}="{1}"'.format(key, _escape_label(label)) for key, label in labels.items())
+            lines.append('{0}{{{1}}} {2}'.format(name, label_text, _format_value(value)))
+
+        return '\n'.join(lines) + '\n'
+
+
+_Families = {
+    'messages_total': ("ISO8583 messages processed, by direction and mti", 'counter'),
+    'bytes_total': ("ISO8583 message bytes processed, by direction", 'counter'),
+    'errors_total': ("ISO8583 errors, by direction and field", 'counter'),
+    'field_seconds': ("Time spent on each field, by direction", 'histogram'),
+}
+
+
+def _known_mti(mti):
+    try:
+        return len(mti) == 4 and mti.isdigit() and valid_mti(mti) == mti
+    except (TypeError, ValueError):
+        return False
+
+
+def _escape_label(label):
+    # backslash, double quote and line feed are escaped in the label values of the text format
+    return label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value)
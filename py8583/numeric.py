@@ -0,0 +1,67 @@
+import binascii
+
+from py8583.errors import ParseError, BuildError
+
+
+# byte -> value of its two BCD digits, None when a nibble is not a decimal digit
+BcdValues = tuple((b >> 4) * 10 + (b & 0x0F) if b >> 4 < 10 and b & 0x0F < 10 else None for b in range(256))
+# value 0-99 -> its BCD byte
+BcdBytes = tuple(bytes([(v // 10) << 4 | v % 10]) for v in range(100))
+
+
+def bcd_to_str(bcd):
+    return binascii.hexlify(bcd).decode('latin')
+
+
+def str_to_bcd(string):
+    # packs hex digits as well, for BCD fields of other content types (e.g. track2)
+    if len(string) % 2 == 1:
+        string = string.zfill(len(string) + 1)
+    return binascii.unhexlify(string)
+
+
+def bcd_to_int(bcd):
+    size = len(bcd)
+    if size == 1:
+        value = BcdValues[bcd[0]]
+    elif size == 2:
+        high, low = BcdValues[bcd[0]], BcdValues[bcd[1]]
+        value = None if high is None or low is None else high * 100 + low
+    else:
+        digits = bcd.hex()
+        # hex() only gives out 0-9 and a-f
+        value = int(digits) if digits.isdigit() else None
+
+    if value is None:
+        raise ParseError("Invalid BCD digits: [{0}]".format(bcd.hex().upper()))
+    return value
+
+
+def int_to_bcd(integer, length=0):
+    # length is the number of digits to zero pad to
+    if 0 <= integer < 100 and length <= 2:
+        return BcdBytes[integer]
+
+    try:
+        # as many digits as the padding, the usual case, formatted and packed in one step
+        return binascii.unhexlify('%0*d' % (length + length % 2, integer))
+    except binascii.Error:
+        # a sign, or an odd number of digits past the padding
+        if integer < 0:
+            raise BuildError("Cannot encode negative value {0} as BCD".format(integer)) from None
+    return binascii.unhexlify('0%d' % integer)
+
+
+def ascii_to_int(data):
+    # int() would also take signs, spaces and underscores. Slices of a parsed message are
+    # memoryviews, which have no isdigit()
+    digits = data if type(data) is bytes else bytes(data)
+    if digits.isdigit():
+        return int(digits)
+    raise ParseError("Invalid numeric value: [{0}]".format(digits.decode('latin')))
+
+
+def int_to_ascii(integer, length=0):
+    if integer < 0:
+        raise BuildError("Cannot encode negative value {0} as digits".format(integer))
+    return b'%0*d' % (length, integer)
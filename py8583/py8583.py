@@ -1,412 +1,553 @@
 import binascii
-import struct
 import logging
+import time
+from array import array
+from collections.abc import Mapping
 
-from py8583.enums import DT, LT, MsgVersion, MsgClass, MsgFunction, MsgOrigin
+from py8583.enums import DT, LT, LH, MsgVersion, MsgClass, MsgFunction, MsgOrigin
 from py8583.errors import ParseError, SpecError, BuildError
+from py8583.numeric import bcd_to_str, str_to_bcd, bcd_to_int, int_to_bcd
+from py8583.codec import SECONDARY_BIT, SECONDARY_WORD, DATA_FIELDS, field_bit, bitmap_fields, read_bitmap, popcount, \
+    ContentCheck, CompositeField, composite_bytes
+from py8583.framing import encode_header
+from py8583.dump import HexDump, mask_value
 from py8583.py8583spec import IsoSpec1987ASCII
 
 
+# the BCD helpers moved to py8583.numeric, and are still exported here
+__all__ = ['Iso8583', 'Bitmap', 'mem_dump', 'buffer_view', 'write_parts', 'valid_mti', 'check_mti',
+           'bcd_to_str', 'str_to_bcd', 'bcd_to_int', 'int_to_bcd',
+           'DT', 'LT', 'LH', 'ParseError', 'SpecError', 'BuildError', 'CompositeField']
+
 log = logging.getLogger('py8583')
 
+_FIELD_NUMBERS = range(1, 129)
 
-def mem_dump(Title, data, size=16):
-    from string import printable as PrintableString
-    printable = bytes(PrintableString, 'ascii').replace(b'\r', b'').replace(b'\n', b'') \
-        .replace(b'\t', b'').replace(b'\x0b', b'') \
-        .replace(b'\x0c', b'')
+# mti -> the str of the parsed messages of that mti, see Iso8583.parse_mti()
+_Mtis = {}
+MaxMtis = 1024
 
+
+def mem_dump(Title, data, size=16):
     if not isinstance(data, bytes):
         raise TypeError("Expected bytes for data")
 
-    log.info(f"{Title} [{ len(data)}]:")
-    dump = "\n"
+    if log.isEnabledFor(logging.INFO):
+        log.info("%s [%d]:\n%s", Title, len(data), HexDump(data, size))
 
-    for line in [data[i:i + size] for i in range(0, len(data), size)]:
 
-        for c in line:
-            dump += "{:02x} ".format(c)
+def buffer_view(iso_msg):
+    # Messages are parsed in place, through a flat byte view of any bytes-like object
+    try:
+        view = memoryview(iso_msg)
+    except TypeError:
+        raise TypeError("Expected a bytes-like object for iso message") from None
 
-        dump += "   " * (size - len(line))
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
 
-        dump += ' | '
-        for c in line:
-            if c in printable:
-                dump += "{:1c}".format(c)
-            else:
-                dump += '.'
 
-        dump += "\n"
+def write_parts(buf, offset, parts, length_header=LH.NONE):
+    # Copy an encoded message into a writable buffer, behind its length header if any
+    length = sum(map(len, parts))
+    header = encode_header(length_header, length)
 
-    log.info(dump)
+    view = buffer_view(buf)
+    end = offset + len(header) + length
+    if end > len(view):
+        raise BuildError("Buffer too small for message: {0} bytes needed, {1} available".format(
+            end - offset, len(view) - offset))
 
+    p = offset
+    for part in (header, *parts):
+        view[p:p + len(part)] = part
+        p += len(part)
 
-def bcd_to_str(bcd):
-    return binascii.hexlify(bcd).decode('latin')
+    return end
 
 
-def str_to_bcd(string):
-    if len(string) % 2 == 1:
-        string = string.zfill(len(string) + 1)
-    return binascii.unhexlify(string)
+def valid_mti(mti):
+    mti = mti.zfill(4)
 
+    if int(mti[0], 16) not in list(map(int, MsgVersion)):
+        raise ValueError("Invalid mti [{0}]: Invalid message version".format(mti))
 
-def bcd_to_int(bcd):
-    return int(bcd_to_str(bcd), 16)
+    if int(mti[1], 16) not in list(map(int, MsgClass)):
+        raise ValueError("Invalid mti [{0}]: Invalid message class".format(mti))
 
+    if int(mti[2], 16) not in list(map(int, MsgFunction)):
+        raise ValueError("Invalid mti [{0}]: Invalid message class".format(mti))
 
-def int_to_bcd(integer):
-    string = str(integer)
-    if len(string) % 2 == 1:
-        string = string.zfill(len(string) + 1)
+    if int(mti[3], 16) not in list(map(int, MsgOrigin)):
+        raise ValueError("Invalid mti [{0}]: Invalid message class".format(mti))
 
-    return binascii.unhexlify(string)
+    return mti
 
 
-class Iso8583:
-    ValidContentTypes = ('a', 'n', 's', 'an', 'as', 'ns', 'ans', 'b', 'z')
+def check_mti(mti, strict=False):
+    try:  # mti should only contain numbers
+        int(mti, 16)
+    except Exception:
+        raise ParseError("Invalid mti: [{0}]".format(mti))
 
-    def __init__(self, iso_msg=None, iso_spec=None):
+    if strict:
+        if mti[1] == '0':
+            raise ParseError("Invalid mti: Invalid Message type [{0}]".format(mti))
 
-        self._mti = None
-        self.strict = False
+        if int(mti[3], 16) > 5:
+            raise ParseError("Invalid mti: Invalid Message origin [{0}]".format(mti))
 
-        self._bitmap = {}
-        self._field_data = {}
-        self._iso = b''
-        self._iso_spec = None
 
-        self._iso_spec = iso_spec if iso_spec is not None else IsoSpec1987ASCII()
+class Bitmap(Mapping):
+    # Read only view of a message bitmap: field number -> 0 or 1, for fields 1-64 or 1-128
 
-        if iso_msg is not None:
-            if not isinstance(iso_msg, bytes):
-                raise TypeError("Expected bytes for iso message")
+    def __init__(self, message):
+        self._message = message
 
-            self._iso = iso_msg
-            self.parse_iso()
+    def __getitem__(self, field):
+        if field in self._fields():
+            return (self._message._bitmap >> (128 - field)) & 0x1
+        raise KeyError(field)
 
-    def strict(self, Value):
-        if Value is not True and Value is not False:
-            raise ValueError
-        self.strict = Value
+    def __iter__(self):
+        return iter(self._fields())
 
-    def set_iso_content(self, iso_msg):
-        if not isinstance(iso_msg, bytes):
-            raise TypeError("Expected bytes for iso message")
-        self._iso = iso_msg
-        self.parse_iso()
-
-    def parse_mti(self, p):
-        data_type = self._iso_spec.data_type('mti')
+    def __len__(self):
+        return len(self._fields())
 
-        if data_type == DT.BCD:
-            self._mti = bcd_to_str(self._iso[p:p + 2])
-            p += 2
-        elif data_type == DT.ASCII:
-            self._mti = self._iso[p:p + 4].decode('latin')
-            p += 4
+    def _fields(self):
+        # 128 fields with the secondary bitmap flag, or secondary fields set before a build
+        return range(1, 129) if self._message._bitmap & (SECONDARY_BIT | SECONDARY_WORD) else range(1, 65)
 
-        try:  # mti should only contain numbers
-            int(self._mti, 16)
-        except Exception:
-            raise ParseError("Invalid mti: [{0}]".format(self._mti))
+    def set_fields(self):
+        return bitmap_fields(self._message._bitmap)
 
-        if self.strict:
-            if self._mti[1] == '0':
-                raise ParseError("Invalid mti: Invalid Message type [{0}]".format(self._mti))
-
-            if int(self._mti[3], 16) > 5:
-                raise ParseError("Invalid mti: Invalid Message origin [{0}]".format(self._mti))
-
-        return p
 
-    def parse_bitmap(self, p):
-        secondary, primary = None, None
+class Iso8583:
+    __slots__ = ('_mti', 'strict', 'exact', 'compact', 'lazy', 'codegen', 'metrics', '_bitmap', '_field_data',
+                 '_field_index', '_indexed', '_iso', '_iso_spec', '_codecs', '_parts')
 
-        data_type = self._iso_spec.data_type(1)
+    ValidContentTypes = ('a', 'n', 's', 'an', 'as', 'ns', 'ans', 'b', 'z')
 
-        if data_type == DT.BIN:
-            primary = self._iso[p:p + 8]
-            p += 8
-        elif data_type == DT.ASCII:
-            primary = binascii.unhexlify(self._iso[p:p + 16])
-            p += 16
+    def __init__(self, iso_msg=None, iso_spec=None, lazy=False, codegen=False, compact=False, metrics=None,
+                 strict=False, exact=False):
 
-        int_primary = struct.unpack_from("!Q", primary)[0]
+        self._mti = None
+        # strict messages check the mti class and origin and the characters of each field
+        # against its content type, and fail on the first invalid field
+        self.strict = strict
+        # exact messages end with their last field, bytes after it failing the parse
+        self.exact = exact
+        # compact messages keep only the raw message and its field index, and decode the
+        # fields on every access: they are always lazy and hold on to a bytes copy of the message
+        self.compact = compact
+        self.lazy = lazy or compact
+        # use the parse and build functions generated for the spec, see IsoSpec.generate()
+        self.codegen = codegen
+        # IsoMetrics instance recording the parsing and building of the message, if any
+        self.metrics = metrics
+
+        self._bitmap = 0
+        # field number -> value of the decoded and set fields. Compact messages have no dict,
+        # but a list indexed by field number of the values set since the parse, made on the first one.
+        self._field_data = None if compact else {}
+        # In lazy mode, (start, length) pairs of the undecoded field values, in bitmap order,
+        # for the fields flagged in _indexed.
+        # The parsed buffer must then be left untouched until the fields are read.
+        self._field_index = None
+        self._indexed = 0
+        self._iso = b''
+        self._iso_spec = None
+        self._codecs = None
+        self._parts = None
 
-        for i in range(1, 65):
-            self._bitmap[i] = (int_primary >> (64 - i)) & 0x1
+        self._iso_spec = iso_spec if iso_spec is not None else IsoSpec1987ASCII()
 
-        if self._bitmap[1] == 1:
-            if data_type == DT.BIN:
-                secondary = self._iso[p:p + 8]
-                p += 8
-            elif data_type == DT.ASCII:
-                secondary = binascii.unhexlify(self._iso[p:p + 16])
-                p += 16
+        if iso_msg is not None:
+            self.set_iso_content(iso_msg)
 
-            int_secondary = struct.unpack_from("!Q", secondary)[0]
+    def set_iso_content(self, iso_msg):
+        if self.compact:
+            self._iso = iso_msg if type(iso_msg) is bytes else bytes(buffer_view(iso_msg))
+        else:
+            self._iso = buffer_view(iso_msg)
 
-            for i in range(1, 65):
-                self._bitmap[i + 64] = (int_secondary >> (64 - i)) & 0x1
+        try:
+            self.parse_iso()
+        finally:
+            if not self.lazy:
+                # eager messages keep no export of the caller's buffer, which can then be reused or resized
+                view, self._iso = self._iso, b''
+                view.release()
 
+    def parse_mti(self, p):
+        mti, p = self._codecs[0].decode(self._iso, p)
+        check_mti(mti, self.strict)
+        # the messages of an mti share its str, for up to MaxMtis of them
+        self._mti = _Mtis.get(mti) or (_Mtis.setdefault(mti, mti) if len(_Mtis) < MaxMtis else mti)
         return p
 
-    def parse_field(self, field, p):
-        length = 0
+    def parse_bitmap(self, p):
+        self._bitmap, p = read_bitmap(self._codecs, self._iso, p)
+        return p
 
+    def parse_field(self, field, p, content=None):
+        # content is the ContentCheck of strict messages
+        codec = self._codecs[field]
+        if self.lazy:
+            start, length, end = codec.scan(self._iso, p)
+        else:
+            self._field_data[field], end = codec.decode(self._iso, p)
+            start = p + codec.prefix
+
+        if content is not None:
+            if end > len(self._iso):
+                raise ParseError("F{0} is truncated ({1}>{2})".format(field, end, len(self._iso)))
+            content.check(codec, start, end)
+
+        if self.lazy:
+            # fields are indexed in bitmap order
+            self._field_index.append(start)
+            self._field_index.append(length)
+            self._indexed |= field_bit(field)
+        return end
+
+    def load_field(self, field):
+        i = 2 * popcount(self._indexed >> (129 - field))
         try:
-            data_type = self._iso_spec.data_type(field)
-            len_type = self._iso_spec.length_type(field)
-            content_type = self._iso_spec.content_type(field)
-            max_length = self._iso_spec.max_length(field)
-        except Exception:
-            raise SpecError("Cannot parse F{0}: Incomplete field specification".format(field))
-
-        # try:
-        if data_type == DT.ASCII and content_type == 'b':
-            max_length *= 2
-
-        if len_type == LT.FIXED:
-            length = max_length
-        elif len_type == LT.LVAR:
-            pass
-        elif len_type == LT.LLVAR:
-            length_data_type = self._iso_spec.length_data_type(field)
-            if length_data_type == DT.ASCII:
-                length = int(self._iso[p:p + 2], 16)
-                p += 2
-            elif length_data_type == DT.BCD:
-                length = bcd_to_int(self._iso[p:p + 1])
-                p += 1
-            else:
-                raise ParseError('Unsupported length data type')
-        elif len_type == LT.LLLVAR:
-            length_data_type = self._iso_spec.length_data_type(field)
-            if length_data_type == DT.ASCII:
-                if b := self._iso[p:p + 3]:
-                    length = int(b, 16)
-                p += 3
-            elif length_data_type == DT.BCD:
-                length = bcd_to_int(self._iso[p:p + 2])
-                p += 2
-            else:
-                raise ParseError('Unsupported length data type')
-
-        if length > max_length:
-            raise ParseError(f"F{field} is larger than maximum length ({length}>{max_length})")
-
-        # In case of zero length, don't try to parse the field itself, just continue
-        if length == 0:
-            self._field_data[field] = None if content_type == 'n' else ''
-            return p
+            value = self._codecs[field].load(self._iso, self._field_index[i], self._field_index[i + 1])
+        except (ParseError, SpecError):
+            raise
+        except Exception as ex:
+            raise ParseError(f"Cannot parse F{field}: {ex}") from None
+
+        if not self.compact:
+            self._field_data[field] = value
+        return value
+
+    def load_fields(self):
+        # All the field values, decoding the indexed fields that were not read yet
+        if self.compact:
+            values = {field: value for field, value in enumerate(self._field_data or ()) if value is not None}
+        else:
+            values = self._field_data
+        for field in bitmap_fields(self._indexed):
+            if field not in values:
+                values[field] = self.load_field(field)
+        return values
 
-        # try:
-        if data_type == DT.ASCII:
-            if content_type == 'n':
-                self._field_data[field] = int(self._iso[p:p + length], 16)
-            else:
-                self._field_data[field] = self._iso[p:p + length].decode('latin')
-            p += length
-        elif data_type == DT.BCD:
-            if length % 2 == 1:
-                length += 1
-            if content_type == 'n':
-                self._field_data[field] = bcd_to_int(self._iso[p:p + (length // 2)])
-            elif content_type == 'z':
-                self._field_data[field] = binascii.hexlify(self._iso[p:p + (length // 2)]).decode('latin').upper()
-            p += length // 2
-        elif data_type == DT.BIN:
-            self._field_data[field] = binascii.hexlify(self._iso[p:p + length]).decode('latin').upper()
-            p += length
-        # except Exception as ex:
-        #     raise ParseError(f"Cannot parse F{field}: {ex}")
-
-        if content_type == 'z':
-            self._field_data[field] = self._field_data[field].replace("D", "=")  # in track2, replace d with =
-            self._field_data[field] = self._field_data[field].replace("F", "")  # in track2, remove trailing f
+    def parse_iso(self):
+        self._codecs = self._iso_spec.compile()
+        self._field_data = None if self.compact else {}
+        # offsets are 16 bit values unless the message is larger
+        self._field_index = array('H' if len(self._iso) <= 0xFFFF else 'I') if self.lazy else None
+        self._indexed = 0
 
-        return p
+        if self.metrics is not None:
+            self._parse_measured()
+            return
 
-    def parse_iso(self):
         p = 0
         p = self.parse_mti(p)
         p = self.parse_bitmap(p)
 
-        for field in sorted(self._bitmap):
-            # field 1 is parsed by the bitmap function
-            if field != 1 and self.field(field) == 1:
-                try:
-                    p = self.parse_field(field, p)
-                except Exception:
-                    break
-
-    def build_mti(self):
-        if self._iso_spec.data_type('mti') == DT.BCD:
-            self._iso += str_to_bcd(self._mti)
-        elif self._iso_spec.data_type('mti') == DT.ASCII:
-            self._iso += self._mti.encode('latin')
-
-    def build_bitmap(self):
-        data_type = self._iso_spec.data_type(1)
-
-        # check if we need a secondary bitmap
-        for i in self._bitmap.keys():
-            if i > 64:
-                self._bitmap[1] = 1
-                break
-
-        int_primary = 0
-        for i in range(1, 65):
-            if i in self._bitmap.keys():
-                int_primary |= (self._bitmap[i] & 0x1) << (64 - i)
-        primary = struct.pack("!Q", int_primary)
-
-        if data_type == DT.BIN:
-            self._iso += primary
-        elif data_type == DT.ASCII:
-            self._iso += binascii.hexlify(primary).upper()
-
-        # Add secondary bitmap if applicable
-        if 1 in self._bitmap.keys() and self._bitmap[1] == 1:
+        # the generated code does not check content types or where the message ends
+        if self.codegen and not (self.lazy or self.strict or self.exact):
+            try:
+                self._iso_spec.generate().parse_fields(self._iso, p, self._bitmap & DATA_FIELDS, self._field_data)
+            except Exception:
+                pass
+            return
 
-            int_secondary = 0
-            for i in range(65, 129):
-                if i in self._bitmap.keys():
-                    int_secondary |= (self._bitmap[i] & 0x1) << (128 - i)
+        if self.lazy and self.strict:
+            content = ContentCheck(self._iso)
 
-            secondary = struct.pack("!Q", int_secondary)
+            # field 1 is parsed by the bitmap function
+            for field in bitmap_fields(self._bitmap & DATA_FIELDS):
+                p = self.parse_field(field, p, content)
+
+        elif self.lazy:
+            # parse_field() inlined: the messages of a bitmap share the index of its leading fixed
+            # size fields, and the fields after them are scanned or laid out from the previous one
+            layout = self._iso_spec.layouts().layout(self._bitmap, p)
+            iso = self._iso
+            index = layout.index[:] if len(iso) <= 0xFFFF else array('I', layout.index)
+            p = layout.end
+            try:
+                for bit, scan, length, size in layout.steps:
+                    if scan is None:
+                        start = p
+                        p += size
+                    else:
+                        start, length, p = scan(iso, p)
+                    index.append(start)
+                    index.append(length)
+            except Exception:
+                # the fields before the invalid one are kept
+                self._indexed = layout.fields & ~((bit << 1) - 1)
+            else:
+                self._indexed = layout.fields
+            # the bitmap integers of the layout are shared by the messages of the bitmap
+            self._bitmap, self._field_index = layout.bitmap, index
+
+        elif self.strict:
+            # parse_field() inlined as below, each field decoded then checked over its span. The
+            # decoders of numeric character fields already take nothing but digits.
+            codecs, iso, values = self._codecs, self._iso, self._field_data
+            content = ContentCheck(iso)
+            bitmap = self._bitmap & DATA_FIELDS
+            while bitmap:
+                top = bitmap.bit_length()
+                codec = codecs[129 - top]
+                values[129 - top], end = codec.decode(iso, p)
+                if end > len(iso):
+                    raise ParseError("F{0} is truncated ({1}>{2})".format(129 - top, end, len(iso)))
+                if codec.marks is not None and codec.content_type != 'n' and \
+                        content[codec.marks].find(1, p + codec.prefix, end) != -1:
+                    raise content.error(codec, p + codec.prefix, end)
+                p = end
+                bitmap ^= 1 << (top - 1)
 
-            if data_type == DT.BIN:
-                self._iso += secondary
-            elif data_type == DT.ASCII:
-                self._iso += binascii.hexlify(secondary)
+        else:
+            # parse_field() inlined, over the set bits of the bitmap from field 2 up
+            codecs, iso, values = self._codecs, self._iso, self._field_data
+            bitmap = self._bitmap & DATA_FIELDS
+            try:
+                while bitmap:
+                    top = bitmap.bit_length()
+                    values[129 - top], p = codecs[129 - top].decode(iso, p)
+                    bitmap ^= 1 << (top - 1)
+            except Exception:
+                # the fields before the invalid one are kept
+                pass
+
+        if self.exact:
+            self.check_end(p)
+
+    def check_end(self, p):
+        # exact messages end with their last field
+        if p > len(self._iso):
+            raise ParseError("{0} bytes missing after the last field".format(p - len(self._iso)))
+        if p < len(self._iso):
+            raise ParseError("{0} bytes after the last field".format(len(self._iso) - p))
+
+    def _parse_measured(self):
+        # parse_iso() with each step recorded in self.metrics. The generated code has no
+        # per field steps, so the fields are always parsed one by one here.
+        metrics = self.metrics
+        clock = time.perf_counter
 
-    def build_field(self, field):
         try:
-            data_type = self._iso_spec.data_type(field)
-            len_type = self._iso_spec.length_type(field)
-            content_type = self._iso_spec.content_type(field)
-            max_length = self._iso_spec.max_length(field)
+            p = self.parse_mti(0)
         except Exception:
-            raise SpecError("Cannot parse F{0}: Incomplete field specification".format(field))
+            metrics.count_error('parse', 'mti')
+            raise
 
-        if len_type == LT.FIXED:
-            length = max_length
-
-            if content_type == 'n':
-                formatter = "{{0:0{0}d}}".format(length)
-            elif 'a' in content_type or 'n' in content_type or 's' in content_type:
-                formatter = "{{0: >{0}}}".format(length)
-            else:
-                formatter = "{0}"
+        try:
+            p = self.parse_bitmap(p)
+        except Exception:
+            metrics.count_error('parse', 'bitmap')
+            raise
 
-            data = formatter.format(self._field_data[field])
+        content = ContentCheck(self._iso) if self.strict else None
 
-        else:
-            length_data_type = self._iso_spec.length_data_type(field)
+        for field in bitmap_fields(self._bitmap & DATA_FIELDS):
+            start = clock()
+            try:
+                p = self.parse_field(field, p, content)
+            except Exception:
+                metrics.count_error('parse', field)
+                if self.strict:
+                    raise
+                break
+            metrics.observe_field('parse', field, clock() - start)
 
-            data = "{0}".format(self._field_data[field])
+        if self.exact:
+            try:
+                self.check_end(p)
+            except ParseError:
+                metrics.count_error('parse', 'end')
+                raise
 
-            if content_type == 'z' and data_type == DT.BIN:
-                if len(data) % 2 == 1:
-                    data = data + 'F'
+        metrics.count_message('parse', self._mti, len(self._iso))
 
-                data = data.replace("=", "D")
+    def build_mti(self):
+        self._parts.append(self._codecs[0].encode(self._mti))
 
-            length = len(data)
-            if data_type == DT.BIN:
-                length //= 2
+    def build_bitmap(self):
+        encode = self._codecs[1].encode
 
-            if length > max_length:
-                raise BuildError("Cannot Build F{0}: field Length larger than specification".format(field))
-            length_data = ''
-            if len_type == LT.LVAR:
-                length_data = "{0:01d}".format(length)
+        # check if we need a secondary bitmap
+        if self._bitmap & SECONDARY_WORD:
+            self._bitmap |= SECONDARY_BIT
 
-            elif len_type == LT.LLVAR:
-                length_data = "{0:02d}".format(length)
+        self._parts.append(encode(self._bitmap >> 64))
 
-            elif len_type == LT.LLLVAR:
-                length_data = "{0:03d}".format(length)
+        # Add secondary bitmap if applicable
+        if self._bitmap & SECONDARY_BIT:
+            self._parts.append(encode(self._bitmap & SECONDARY_WORD))
 
-            if length_data_type == DT.ASCII:
-                self._iso += length_data.encode('latin')
-            elif length_data_type == DT.BCD:
-                self._iso += str_to_bcd(length_data)
-            elif length_data_type == DT.BIN:
-                self._iso += binascii.unhexlify(length_data)
+    def build_field(self, field, values=None):
+        # values are those of load_fields(), if already read
+        value = self._value(field) if values is None else values[field]
+        self._parts.append(self._codecs[field].encode(value))
 
-        if data_type == DT.ASCII:
-            self._iso += data.encode('latin')
-        elif data_type == DT.BCD:
-            self._iso += str_to_bcd(data)
-        elif data_type == DT.BIN:
-            self._iso += binascii.unhexlify(self._field_data[field])
+    def build_parts(self):
+        # Encode the message as a list of byte strings, joined or copied out once by the callers
+        values = self.load_fields()
+        self._codecs = self._iso_spec.compile()
 
-    def build_iso(self):
-        self._iso = b''
+        self._parts = []
         self.build_mti()
         self.build_bitmap()
 
-        for field in sorted(self._bitmap):
-            if field != 1 and self.field(field) == 1:
+        if self.metrics is not None:
+            self._build_measured(values)
+        elif self.codegen:
+            self._iso_spec.generate().build_fields(self._bitmap & DATA_FIELDS, values, self._parts)
+        else:
+            for field in bitmap_fields(self._bitmap & DATA_FIELDS):
                 try:
-                    self.build_field(field)
+                    self.build_field(field, values)
                 except Exception as ex:
                     raise type(ex)('Error building F{}: '.format(field) + repr(ex)) from None
 
+        parts, self._parts = self._parts, None
+        return parts
+
+    def _build_measured(self, values):
+        metrics = self.metrics
+        clock = time.perf_counter
+
+        for field in bitmap_fields(self._bitmap & DATA_FIELDS):
+            start = clock()
+            try:
+                self.build_field(field, values)
+            except Exception as ex:
+                metrics.count_error('build', field)
+                raise type(ex)('Error building F{}: '.format(field) + repr(ex)) from None
+            metrics.observe_field('build', field, clock() - start)
+
+        metrics.count_message('build', self._mti, sum(map(len, self._parts)))
+
+    def build_iso(self):
+        self._iso = b''.join(self.build_parts())
         return self._iso
 
+    def build_into(self, buf, offset=0, length_header=LH.NONE):
+        """Build the message straight into a writable buffer, returns the offset past its end"""
+        return write_parts(buf, offset, self.build_parts(), length_header)
+
     def field(self, field, Value=None):
         if Value is None:
-            try:
-                return self._bitmap[field]
-            except KeyError:
-                return None
-        elif Value in (1, 0):
-            self._bitmap[field] = Value
+            if field in _FIELD_NUMBERS:
+                return (self._bitmap >> (128 - field)) & 0x1
+            return None
+        elif field not in _FIELD_NUMBERS:
+            raise ValueError
+        elif Value == 1:
+            self._bitmap |= field_bit(field)
+        elif Value == 0:
+            self._bitmap &= ~field_bit(field)
         else:
             raise ValueError
 
+    def _stored(self, field):
+        # value decoded or set for a field, None if there is none
+        if self.compact:
+            return self._field_data[field] if self._field_data is not None and field in _FIELD_NUMBERS else None
+        return self._field_data.get(field)
+
+    def _value(self, field):
+        value = self._stored(field)
+        if value is None:
+            if field in _FIELD_NUMBERS and self._indexed & field_bit(field):
+                return self.load_field(field)
+            raise KeyError(field)
+        return value
+
     def field_data(self, field, Value=None):
         if Value is None:
             try:
-                return self._field_data[field]
+                return self._value(field)
             except KeyError:
                 return None
         else:
-            if len(str(Value)) > self._iso_spec.max_length(field):
+            # composite field values are checked when built
+            if not isinstance(Value, Mapping) and len(str(Value)) > self._iso_spec.max_length(field):
                 raise ValueError('Value length larger than field maximum ({0})'.format(self._iso_spec.max_length(field))
                                  )
 
-            self._field_data[field] = Value
+            self._set_value(field, Value)
+
+    def _set_value(self, field, value):
+        if not self.compact:
+            self._field_data[field] = value
+        elif field in _FIELD_NUMBERS:
+            if self._field_data is None:
+                self._field_data = [None] * 129
+            self._field_data[field] = value
+        else:
+            raise ValueError('Invalid field F{0}'.format(field))
 
     def fields(self):
-        return self._field_data
+        return self.load_fields()
+
+    def field_span(self, field):
+        """(start, end) offsets of the raw value of a lazily parsed field, None if it was not indexed"""
+        if field not in _FIELD_NUMBERS or not self._indexed & field_bit(field):
+            return None
+
+        i = 2 * popcount(self._indexed >> (129 - field))
+        start, length = self._field_index[i], self._field_index[i + 1]
+        if self._codecs[field].data_type == DT.BCD:
+            length = (length + 1) // 2
+        return start, start + length
+
+    def field_bytes(self, field, data=None):
+        """Binary value of a field, e.g. the EMV data of field 55, or set it when data is given
+
+        Binary fields and hex text fields (content type 'b') are taken as the bytes they encode,
+        other fields as latin-1 text. Fields of a lazy message that were not changed since the
+        parse are not decoded: BIN and plain ASCII values are memoryviews of the message.
+        """
+        codec = (self._codecs or self._iso_spec.compile())[field]
+        # binary data is kept as hex text in the field values
+        hex_text = codec.data_type == DT.BIN or codec.content_type == 'b'
+
+        if data is not None:
+            data = bytes(data)
+            if codec.nested is not None:
+                self.field_data(field, CompositeField(codec.nested, data))
+                return
+
+            # the maximum length of binary and hex text fields is in bytes, not in hex digits
+            if len(data) > codec.max_length:
+                raise ValueError('Value length larger than field maximum ({0})'.format(codec.max_length))
+            self._set_value(field, data.hex().upper() if hex_text else data.decode('latin'))
+            return
+
+        span = None if self._stored(field) is not None else self.field_span(field)
+        if span is not None and codec.data_type in (DT.BIN, DT.ASCII):
+            raw = memoryview(self._iso)[span[0]:span[1]]
+            return binascii.unhexlify(raw) if codec.data_type == DT.ASCII and hex_text else raw
+
+        value = self.field_data(field)
+        if value is None:
+            return None
+        if codec.nested is not None:
+            return composite_bytes(codec.nested, value)
+        return binascii.unhexlify(value) if hex_text else str(value).encode('latin')
 
     def bitmap(self):
-        return self._bitmap
+        return Bitmap(self)
 
     def mti(self, mti=None):
         if mti is None:
             return self._mti
         else:
-            mti = mti.zfill(4)
-
-            if int(mti[0], 16) not in list(map(int, MsgVersion)):
-                raise ValueError("Invalid mti [{0}]: Invalid message version".format(mti))
-
-            if int(mti[1], 16) not in list(map(int, MsgClass)):
-                raise ValueError("Invalid mti [{0}]: Invalid message class".format(mti))
-
-            if int(mti[2], 16) not in list(map(int, MsgFunction)):
-                raise ValueError("Invalid mti [{0}]: Invalid message class".format(mti))
-
-            if int(mti[3], 16) not in list(map(int, MsgOrigin)):
-                raise ValueError("Invalid mti [{0}]: Invalid message class".format(mti))
-
-            self._mti = mti
+            self._mti = valid_mti(mti)
 
     def version(self):
         for i in MsgVersion:
@@ -442,24 +583,20 @@ class Iso8583:
         self.debug_message(level)
 
     def debug_message(self, level=logging.DEBUG):
-        log.log(level, "mti:    [{0}]".format(self._mti))
-
-        bitmap_line = "fields: [ "
-        for i in sorted(self._bitmap.keys()):
-            if i == 1:
-                continue
-            if self._bitmap[i] == 1:
-                bitmap_line += str(i) + " "
-        bitmap_line += "]"
-        log.log(level, bitmap_line)
-
-        for i in sorted(self._bitmap.keys()):
-            if i == 1:
-                continue
-            if self._bitmap[i] == 1:
-                field_data = '' if not self._field_data.get(i) else f
-
-                if self.content_type(i) == 'n' and self._iso_spec.length_type(i) == LT.FIXED:
-                    field_data = str(field_data).zfill(self._iso_spec.max_length(i))
-
-                log.log(level, "\t{0:>3d} - {1: <41} : [{2}]".format(i, self._iso_spec.description(i), field_data))
+        # Sensitive fields are masked, see dump.Masks
+        if not log.isEnabledFor(level):
+            return
+
+        fields = list(bitmap_fields(self._bitmap & DATA_FIELDS))
+        log.log(level, "mti:    [%s]", self._mti)
+        log.log(level, "fields: [ %s ]", " ".join(map(str, fields)))
+
+        for i in fields:
+            field_data = self.field_data(i)
+            if field_data is None:
+                field_data = ''
+
+            if self.content_type(i) == 'n' and self._iso_spec.length_type(i) == LT.FIXED:
+                field_data = str(field_data).zfill(self._iso_spec.max_length(i))
+
+            log.log(level, "\t%3d - %-41s : [%s]", i, self._iso_spec.description(i), mask_value(i, field_data))
@@ -1,22 +1,146 @@
+import threading
+from types import MappingProxyType
+
 from py8583.errors import SpecError
 from py8583.enums import DT, LT
+from py8583.codec import compile_spec, FieldLayouts
+from py8583.codegen import generate_spec
 
 Descriptions = {}
 ContentTypes = {}
 
 
+def copy_table(table):
+    return {key: dict(entry) for key, entry in table.items()}
+
+
+def freeze_table(table):
+    return MappingProxyType({key: MappingProxyType(dict(entry)) for key, entry in table.items()})
+
+
 class IsoSpec:
     _ValidContentTypes = ('a', 'n', 's', 'an', 'as', 'ns', 'ans', 'b', 'z')
 
-    Descriptions = {}
-    ContentTypes = {}
-    DataTypes = {}
+    # Whether the tables built by the set_* hooks are the same for all the instances of the
+    # class. Classes whose hooks depend on constructor arguments set it to False, for each
+    # instance to build its own tables and codecs.
+    ShareTables = True
+
+    # spec class -> its frozen (Descriptions, ContentTypes, DataTypes) tables, shared by all
+    # the instances of the class until they are changed through the setters
+    _SharedTables = {}
+    _SharedCodecs = {}
+    _SharedGenerated = {}
+    _SharedLayouts = {}
+    _SharedLock = threading.Lock()
 
     def __init__(self):
+        self._codecs = None
+        self._generated = None
+        self._layouts = None
+
+        if not self.ShareTables:
+            self._build_tables()
+            return
+
+        self._share_tables()
+
+    def _build_tables(self):
+        # Run the set_* hooks on private tables
+        self.Descriptions = {}
+        self.ContentTypes = {}
+        self.DataTypes = {}
+        self._frozen = False
+
         self.set_descriptions()
         self.set_content_types()
         self.set_data_types()
 
+    def _share_tables(self):
+        # Use the frozen tables of the class, built on its first instance
+        shared = self._SharedTables.get(type(self))
+        if shared is None:
+            self._build_tables()
+            shared = (MappingProxyType(dict(self.Descriptions)), freeze_table(self.ContentTypes),
+                      freeze_table(self.DataTypes))
+            with self._SharedLock:
+                shared = self._SharedTables.setdefault(type(self), shared)
+
+        self.Descriptions, self.ContentTypes, self.DataTypes = shared
+        self._frozen = True
+
+    def _thaw(self):
+        # Copy on write: the first change gives the instance its own tables
+        if self._frozen:
+            self.Descriptions = dict(self.Descriptions)
+            self.ContentTypes = copy_table(self.ContentTypes)
+            self.DataTypes = copy_table(self.DataTypes)
+            self._frozen = False
+        self._codecs = None
+
+    def __getstate__(self):
+        # The codec tables are rebuilt on demand and frozen tables are shared per class
+        state = dict(self.__dict__)
+        del state['_codecs'], state['_generated'], state['_layouts']
+        if self._frozen:
+            del state['Descriptions'], state['ContentTypes'], state['DataTypes']
+        return state
+
+    def __setstate__(self, state):
+        # __init__ is not run, it may take arguments
+        self.__dict__.update(state)
+        self._codecs = None
+        self._generated = None
+        self._layouts = None
+        if self._frozen:
+            self._share_tables()
+
+    def compile(self):
+        """Return the codec table of the spec, indexed by field number (0 is the mti)
+
+        The table is built on first use, once per spec class while the spec is not changed,
+        and dropped whenever the spec is changed through its setters.
+        """
+        if self._codecs is None:
+            if self._frozen:
+                codecs = self._SharedCodecs.get(type(self))
+                if codecs is None:
+                    with self._SharedLock:
+                        codecs = self._SharedCodecs.setdefault(type(self), compile_spec(self))
+                self._codecs = codecs
+            else:
+                self._codecs = compile_spec(self)
+        return self._codecs
+
+    def generate(self):
+        """Return the parse and build functions generated for the spec, see py8583.codegen"""
+        codecs = self.compile()
+        if self._generated is None or self._generated.codecs is not codecs:
+            if self._frozen:
+                # generated once per spec class, like the codec table it is built from
+                generated = self._SharedGenerated.get(type(self))
+                if generated is None:
+                    with self._SharedLock:
+                        generated = self._SharedGenerated.setdefault(type(self), generate_spec(self))
+                self._generated = generated
+            else:
+                self._generated = generate_spec(self)
+        return self._generated
+
+    def layouts(self):
+        """Return the FieldLayouts of the codec table of the spec, see py8583.codec.field_layout()"""
+        codecs = self.compile()
+        if self._layouts is None or self._layouts.codecs is not codecs:
+            if self._frozen:
+                layouts = self._SharedLayouts.get(type(self))
+                if layouts is None:
+                    with self._SharedLock:
+                        layouts = self._SharedLayouts.setdefault(type(self), FieldLayouts(codecs))
+                self._layouts = layouts
+            else:
+                self._layouts = FieldLayouts(codecs)
+        return self._layouts
+
     def set_descriptions(self):
         pass
 
@@ -30,6 +154,7 @@ class IsoSpec:
         if description is None:
             return self.Descriptions[field]
         else:
+            self._thaw()
             self.Descriptions[field] = description
 
     def data_type(self, field, data_type=None):
@@ -38,6 +163,7 @@ class IsoSpec:
         else:
             if data_type not in DT:
                 raise SpecError("Cannot set data type '{0}' for F{1}: Invalid data type".format(data_type, field))
+            self._thaw()
             if field not in self.DataTypes.keys():
                 self.DataTypes[field] = {}
             self.DataTypes[field]['Data'] = data_type
@@ -47,6 +173,9 @@ class IsoSpec:
             if content_type not in self._ValidContentTypes:
                 raise SpecError(
                     "Cannot set Content type '{0}' for F{1}: Invalid content type".format(content_type, field))
+            self._thaw()
+            if field not in self.ContentTypes.keys():
+                self.ContentTypes[field] = {}
             self.ContentTypes[field]['content_type'] = content_type
         else:
             return self.ContentTypes[field]['content_type']
@@ -55,6 +184,9 @@ class IsoSpec:
         if max_length is None:
             return self.ContentTypes[field]['MaxLen']
         else:
+            self._thaw()
+            if field not in self.ContentTypes.keys():
+                self.ContentTypes[field] = {}
             self.ContentTypes[field]['MaxLen'] = max_length
 
     def length_type(self, field, length_type=None):
@@ -63,6 +195,9 @@ class IsoSpec:
         else:
             if length_type not in LT:
                 raise SpecError("Cannot set Length type '{0}' for F{1}: Invalid length type".format(length_type, field))
+            self._thaw()
+            if field not in self.ContentTypes.keys():
+                self.ContentTypes[field] = {}
             self.ContentTypes[field]['len_type'] = length_type
 
     def length_data_type(self, field, length_data_type=None):
@@ -72,17 +207,33 @@ class IsoSpec:
             if length_data_type not in DT:
                 raise SpecError("Cannot set data type '{0}' for F{1}: Invalid data type".format(length_data_type, field)
                                 )
+            self._thaw()
             if field not in self.DataTypes.keys():
                 self.DataTypes[field] = {}
             self.DataTypes[field]['Length'] = length_data_type
 
+    def nested_spec(self, field, nested_spec=None):
+        """Spec of the subfields of a composite field, None for plain fields
+
+        A composite field (e.g. field 127 of many networks) holds its own bitmap and subfields.
+        Its nested spec is declared like any spec, slot 1 being the bitmap of the subfields and
+        the mti left out. Its values are CompositeField, see py8583.codec.
+        """
+        if nested_spec is None:
+            return self.DataTypes.get(field, {}).get('Nested')
+        else:
+            self._thaw()
+            if field not in self.DataTypes.keys():
+                self.DataTypes[field] = {}
+            self.DataTypes[field]['Nested'] = nested_spec
+
 
 class IsoSpec1987(IsoSpec):
     def set_descriptions(self):
-        self.Descriptions = Descriptions['1987']
+        self.Descriptions = dict(Descriptions['1987'])
 
     def set_content_types(self):
-        self.ContentTypes = ContentTypes['1987']
+        self.ContentTypes = copy_table(ContentTypes['1987'])
 
 
 class IsoSpec1987ASCII(IsoSpec1987):
@@ -134,12 +285,27 @@ class IsoSpec1987BCD(IsoSpec1987):
                 self.length_data_type(field, DT.BCD)
 
 
+class IsoSpec1987EBCDIC(IsoSpec1987):
+    def set_data_types(self):
+        self.data_type('mti', DT.EBCDIC)
+        self.data_type(1, DT.BIN)  # bitmap
+
+        for field in self.ContentTypes.keys():
+            if self.content_type(field) == 'b':
+                self.data_type(field, DT.BIN)
+            else:
+                self.data_type(field, DT.EBCDIC)
+
+            if self.length_type(field) != LT.FIXED:
+                self.length_data_type(field, DT.EBCDIC)
+
+
 class IsoSpec1993(IsoSpec):
     def set_descriptions(self):
-        self.Descriptions = Descriptions['1993']
+        self.Descriptions = dict(Descriptions['1993'])
 
     def set_content_types(self):
-        self.ContentTypes = ContentTypes['1993']
+        self.ContentTypes = copy_table(ContentTypes['1993'])
 
 
 class IsoSpec1993ASCII(IsoSpec1993):
@@ -153,6 +319,48 @@ class IsoSpec1993ASCII(IsoSpec1993):
                 self.length_data_type(field, DT.ASCII)
 
 
+class IsoSpec1993BCD(IsoSpec1993):
+    def set_content_types(self):
+        super().set_content_types()
+        # private fields as binary, as in IsoSpec1987BCD
+        for field in self.ContentTypes.keys():
+            if self.max_length(field) == 999:
+                self.content_type(field, 'b')
+
+    def set_data_types(self):
+        self.data_type('mti', DT.BCD)
+        self.data_type(1, DT.BIN)  # bitmap
+
+        for field in self.ContentTypes.keys():
+
+            content_type = self.content_type(field)
+
+            if 'a' in content_type or 's' in content_type:
+                self.data_type(field, DT.ASCII)
+            elif content_type == 'b':
+                self.data_type(field, DT.BIN)
+            else:
+                self.data_type(field, DT.BCD)
+
+            if self.length_type(field) != LT.FIXED:
+                self.length_data_type(field, DT.BCD)
+
+
+class IsoSpec1993EBCDIC(IsoSpec1993):
+    def set_data_types(self):
+        self.data_type('mti', DT.EBCDIC)
+        self.data_type(1, DT.BIN)  # bitmap
+
+        for field in self.ContentTypes.keys():
+            if self.content_type(field) == 'b':
+                self.data_type(field, DT.BIN)
+            else:
+                self.data_type(field, DT.EBCDIC)
+
+            if self.length_type(field) != LT.FIXED:
+                self.length_data_type(field, DT.EBCDIC)
+
+
 Descriptions['1987'] = {
     1: 'bitmap',
     2: 'primary account number (PAN)',
@@ -0,0 +1,87 @@
+from py8583.enums import DT, MsgVersion
+from py8583.errors import ParseError, SpecError
+from py8583.py8583 import Iso8583
+from py8583.py8583spec import IsoSpec1987ASCII, IsoSpec1987BCD, IsoSpec1987EBCDIC, IsoSpec1993ASCII, \
+    IsoSpec1993BCD, IsoSpec1993EBCDIC
+
+
+# first byte of a message -> (mti data type, version digit), read off its mti. ASCII digits are
+# 0x30-0x39, EBCDIC digits 0xF0-0xF9, and a BCD mti starts with the version in the high nibble.
+# BCD bytes 0x30-0x39 would be version 3, which does not exist.
+MtiFormats = [None] * 256
+for _version in range(10):
+    for _digit in range(10):
+        MtiFormats[(_version << 4) | _digit] = (DT.BCD, _version)
+for _version in range(10):
+    MtiFormats[0x30 + _version] = (DT.ASCII, _version)
+    MtiFormats[0xF0 + _version] = (DT.EBCDIC, _version)
+del _version, _digit
+
+
+def sniff(data):
+    """(mti data type, version digit) of a raw message, None if its first byte is no mti digit"""
+    return MtiFormats[data[0]] if len(data) else None
+
+
+DefaultSpecs = {
+    (MsgVersion.ISO1987, DT.ASCII): IsoSpec1987ASCII,
+    (MsgVersion.ISO1987, DT.BCD): IsoSpec1987BCD,
+    (MsgVersion.ISO1987, DT.EBCDIC): IsoSpec1987EBCDIC,
+    (MsgVersion.ISO1993, DT.ASCII): IsoSpec1993ASCII,
+    (MsgVersion.ISO1993, DT.BCD): IsoSpec1993BCD,
+    (MsgVersion.ISO1993, DT.EBCDIC): IsoSpec1993EBCDIC,
+}
+
+
+class SpecRegistry:
+    """Picks the spec of raw messages from the version digit and the encoding of their mti
+
+    Both are read off the first byte of a message, so that it is parsed once, with a spec
+    compiled when it was registered. Specs are registered per (MsgVersion, mti data type);
+    the bitmap and field layout is the one of the spec, e.g. a spec of ASCII fields with a
+    binary bitmap is registered for DT.ASCII in place of IsoSpec1987ASCII.
+    """
+
+    def __init__(self, specs=None):
+        # first byte -> spec
+        self._table = [None] * 256
+        self._specs = {}
+        for (version, data_type), spec in (DefaultSpecs if specs is None else specs).items():
+            self.register(version, data_type, spec)
+
+    def register(self, version, data_type, spec):
+        """Use spec, a spec class or instance, for the messages of a version and mti encoding"""
+        version, data_type = MsgVersion(version), DT(data_type)
+        if data_type == DT.BIN:
+            raise SpecError("Cannot register a spec for binary mti")
+
+        if isinstance(spec, type):
+            spec = spec()
+        if spec.data_type('mti') != data_type:
+            raise SpecError("Cannot register {0} for {1} mti: Its mti is {2}".format(
+                type(spec).__name__, data_type.name, DT(spec.data_type('mti')).name))
+        spec.compile()
+
+        self._specs[(version, data_type)] = spec
+        for byte, mti_format in enumerate(MtiFormats):
+            if mti_format == (data_type, version):
+                self._table[byte] = spec
+
+    def specs(self):
+        """(version, mti data type) -> spec of the registered specs"""
+        return dict(self._specs)
+
+    def spec(self, data):
+        """The spec of a raw message, ParseError if none is registered for it"""
+        spec = self._table[data[0]] if len(data) else None
+        if spec is None:
+            mti_format = sniff(data)
+            if mti_format is None:
+                raise ParseError("Unknown message format: no mti at the start of the message")
+            raise ParseError("No spec registered for {0} mti of version {1}".format(mti_format[0].name,
+                                                                                   mti_format[1]))
+        return spec
+
+    def parse(self, data, **options):
+        """Iso8583 of a raw message, parsed with its spec, options being those of Iso8583"""
+        return Iso8583(data, iso_spec=self.spec(data), **options)
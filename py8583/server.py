@@ -0,0 +1,133 @@
+import asyncio
+import logging
+
+from py8583.enums import LH
+from py8583.errors import ParseError
+from py8583.framing import TPDU_SIZE, header_size, decode_header, encode_header
+from py8583.py8583 import Iso8583
+from py8583.py8583spec import IsoSpec1987ASCII
+
+
+log = logging.getLogger('py8583.server')
+
+
+class IsoServer:
+    """asyncio host for length prefixed ISO8583 traffic
+
+    Requests are parsed with the server spec and dispatched on their mti to async handlers,
+    registered with add_handler() or the handler() decorator. A handler gets the parsed
+    Iso8583 and returns the response to send back, or None. Requests of one connection are
+    handled concurrently, up to max_pending at a time, after which the connection is not read
+    from until a response has been written out. With a SpecRegistry as registry, each request
+    is parsed with the spec the registry picks for it instead.
+    """
+
+    def __init__(self, spec=None, length_header=LH.BIN2, tpdu=False, lazy=False, max_pending=64, metrics=None,
+                 registry=None, strict=False):
+        if header_size(length_header) == 0:
+            raise ValueError("A length header is needed to frame messages on a stream")
+
+        self.spec = spec if spec is not None else IsoSpec1987ASCII()
+        self.length_header = length_header
+        self.tpdu = tpdu
+        self.lazy = lazy
+        # parse the requests in strict mode, see Iso8583.strict
+        self.strict = strict
+        self.max_pending = max_pending
+        # IsoMetrics of the requests parsed, if any
+        self.metrics = metrics
+        self.registry = registry
+
+        self._handlers = {}
+        self._default_handler = None
+        self._server = None
+
+    def add_handler(self, mti, handler):
+        if mti is None:
+            self._default_handler = handler
+        else:
+            self._handlers[mti] = handler
+
+    def handler(self, mti=None):
+        def register(handler):
+            self.add_handler(mti, handler)
+            return handler
+
+        return register
+
+    async def start(self, host=None, port=8583, **kwargs):
+        self._server = await asyncio.start_server(self.handle_connection, host, port, **kwargs)
+        return self._server
+
+    async def serve_forever(self, host=None, port=8583, **kwargs):
+        server = await self.start(host, port, **kwargs)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        size = header_size(self.length_header)
+        pending = asyncio.Semaphore(self.max_pending)
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(size)
+                    frame = await reader.readexactly(decode_header(self.length_header, header))
+                except asyncio.IncompleteReadError:
+                    break
+
+                await pending.acquire()
+                task = asyncio.ensure_future(self.handle_frame(frame, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: pending.release())
+
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, ParseError) as ex:
+            log.warning("Connection from {0} dropped: {1}".format(peer, ex))
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def handle_frame(self, frame, writer, write_lock):
+        tpdu = b''
+        if self.tpdu:
+            tpdu, frame = frame[:TPDU_SIZE], frame[TPDU_SIZE:]
+
+        try:
+            spec = self.spec if self.registry is None else self.registry.spec(frame)
+            request = Iso8583(frame, iso_spec=spec, lazy=self.lazy, metrics=self.metrics, strict=self.strict)
+        except Exception as ex:
+            log.warning("Dropping unparsable message: {0}".format(ex))
+            return
+
+        handler = self._handlers.get(request.mti(), self._default_handler)
+        if handler is None:
+            log.warning("No handler for mti [{0}]".format(request.mti()))
+            return
+
+        try:
+            response = await handler(request)
+            if response is None:
+                return
+            data = response.build_iso()
+        except Exception:
+            log.exception("Handler failed for mti [{0}]".format(request.mti()))
+            return
+
+        if tpdu:
+            # the response goes back to the source address of the request
+            data = tpdu[:1] + tpdu[3:5] + tpdu[1:3] + data
+
+        async with write_lock:
+            writer.write(encode_header(self.length_header, len(data)) + data)
+            await writer.drain()
@@ -0,0 +1,142 @@
+"""Specs described in JSON or TOML files, as overrides on top of a spec class
+
+    {
+        "base": "IsoSpec1987ASCII",
+        "fields": {
+            "41": {"max_length": 16},
+            "44": {"max_length": 27},
+            "127": {"description": "Private data", "content_type": "ans", "max_length": 999,
+                    "length_type": "LLLVAR", "data_type": "ASCII", "length_data_type": "ASCII"}
+        }
+    }
+
+base names a spec class of py8583.py8583spec, IsoSpec (no field at all) by default. Fields
+are 'mti', '1' for the bitmap or data field numbers, and take the settings of the IsoSpec
+setters, types being given by name (LT and DT). A "nested" setting is the document of the
+spec of a composite field, see IsoSpec.nested_spec.
+"""
+import hashlib
+import json
+import marshal
+import os
+import pickle
+import tempfile
+from importlib.util import MAGIC_NUMBER
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+from py8583 import py8583spec
+from py8583.codegen import CodeName, GeneratedCodec, generate_source
+from py8583.enums import DT, LT
+from py8583.errors import SpecError
+
+
+# Bumped whenever the cached form changes
+CacheVersion = 1
+
+_Settings = {
+    'description': (str, py8583spec.IsoSpec.description),
+    'content_type': (str, py8583spec.IsoSpec.content_type),
+    'max_length': (int, py8583spec.IsoSpec.max_length),
+    'length_type': (LT.__getitem__, py8583spec.IsoSpec.length_type),
+    'data_type': (DT.__getitem__, py8583spec.IsoSpec.data_type),
+    'length_data_type': (DT.__getitem__, py8583spec.IsoSpec.length_data_type),
+}
+
+
+def read_document(data, file_format):
+    """The spec document of the content of a 'json' or 'toml' file"""
+    if file_format == 'json':
+        return json.loads(data)
+    elif file_format == 'toml':
+        if tomllib is None:
+            raise SpecError("TOML spec files need Python 3.11 or later")
+        return tomllib.loads(data.decode('utf-8') if isinstance(data, bytes) else data)
+    raise SpecError("Unsupported spec file format '{0}'".format(file_format))
+
+
+def spec_from_document(document):
+    """Build the spec a document describes"""
+    base_name = document.get('base', 'IsoSpec')
+    base = getattr(py8583spec, base_name, None)
+    if not (isinstance(base, type) and issubclass(base, py8583spec.IsoSpec)):
+        raise SpecError("Unknown base spec '{0}'".format(base_name))
+
+    spec = base()
+    for key, settings in document.get('fields', {}).items():
+        try:
+            field = key if key == 'mti' else int(key)
+        except ValueError:
+            raise SpecError("Invalid field '{0}'".format(key)) from None
+        if field != 'mti' and field not in range(1, 129):
+            raise SpecError("Invalid field '{0}'".format(key))
+
+        for name, value in settings.items():
+            if name == 'nested':
+                spec.nested_spec(field, spec_from_document(value))
+                continue
+
+            try:
+                convert, setter = _Settings[name]
+            except KeyError:
+                raise SpecError("Unknown setting '{0}' of F{1}".format(name, field)) from None
+            try:
+                value = convert(value)
+            except (KeyError, TypeError, ValueError):
+                raise SpecError("Invalid {0} '{1}' for F{2}".format(name, value, field)) from None
+            setter(spec, field, value)
+
+    return spec
+
+
+def load_spec(path, cache_dir=None):
+    """Load the spec of a JSON (.json) or TOML (.toml) spec file
+
+    With a cache_dir, the spec and its generated code (see IsoSpec.generate) are compiled
+    once and pickled there, keyed by a hash of the file content and of the Python version,
+    and later loads with the same content read the pickle instead. The cache directory must
+    only be writable by trusted users. Changes to the base spec classes are not tracked:
+    clear the cache when py8583 is upgraded.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    file_format = os.path.splitext(path)[1][1:].lower()
+
+    if cache_dir is None:
+        return spec_from_document(read_document(data, file_format))
+
+    key = hashlib.sha256(b'%d\0%s\0%s\0' % (CacheVersion, MAGIC_NUMBER, file_format.encode()) + data).hexdigest()
+    cache_path = os.path.join(cache_dir, key + '.pickle')
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except Exception:
+        # missing, or left by an incompatible version: rebuilt below
+        cached = None
+
+    if cached is not None:
+        spec = cached['spec']
+        spec._generated = GeneratedCodec(spec.compile(), cached['source'], marshal.loads(cached['code']))
+        return spec
+
+    spec = spec_from_document(read_document(data, file_format))
+    source = generate_source(spec.compile())
+    code = compile(source, CodeName, 'exec')
+    spec._generated = GeneratedCodec(spec.compile(), source, code)
+
+    # written aside then renamed, for concurrent loads to see whole files only
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'spec': spec, 'source': source, 'code': marshal.dumps(code)}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return spec
@@ -0,0 +1,121 @@
+from collections.abc import Mapping
+
+from py8583.codec import SECONDARY_BIT, SECONDARY_WORD, DATA_FIELDS, field_bit, bitmap_fields
+from py8583.enums import LH
+from py8583.py8583 import valid_mti, write_parts
+from py8583.py8583spec import IsoSpec1987ASCII
+
+
+class MessageTemplate:
+    """Message builder that keeps the encoded form of its fields between builds
+
+    Fields are encoded once when set and only changed fields are encoded again on the next
+    build, their bytes being spliced into the cached parts of the message. A template set up
+    with the constant fields of a terminal therefore only pays for the fields that change
+    per message (amount, STAN, dates, RRN...).
+    """
+
+    def __init__(self, mti, fields=None, spec=None):
+        self._iso_spec = spec if spec is not None else IsoSpec1987ASCII()
+        self._codecs = self._iso_spec.compile()
+
+        self._values = {}
+        self._encoded = {}
+        self._dirty = set()
+        # cached message parts: mti, bitmap(s) then one part per field in bitmap order
+        self._parts = None
+        self._positions = None
+
+        self.mti(mti)
+        if fields:
+            self.update(fields)
+
+    def mti(self, mti=None):
+        if mti is None:
+            return self._mti
+
+        self._mti = valid_mti(mti)
+        self._encoded_mti = self._codecs[0].encode(self._mti)
+        if self._parts is not None:
+            self._parts[0] = self._encoded_mti
+
+    def __getitem__(self, field):
+        return self._values[field]
+
+    def __setitem__(self, field, value):
+        max_length = self._codecs[field].max_length
+        if max_length is not None and not isinstance(value, Mapping) and len(str(value)) > max_length:
+            raise ValueError('Value length larger than field maximum ({0})'.format(max_length))
+
+        if field not in self._values:
+            self._parts = None
+        self._values[field] = value
+        self._dirty.add(field)
+
+    def __delitem__(self, field):
+        del self._values[field]
+        self._encoded.pop(field, None)
+        self._dirty.discard(field)
+        self._parts = None
+
+    def __contains__(self, field):
+        return field in self._values
+
+    def update(self, fields):
+        for field, value in fields.items():
+            self[field] = value
+
+    def fields(self):
+        return dict(self._values)
+
+    def _encode_dirty(self):
+        for field in sorted(self._dirty):
+            try:
+                self._encoded[field] = self._codecs[field].encode(self._values[field])
+            except Exception as ex:
+                raise type(ex)('Error building F{}: '.format(field) + repr(ex)) from None
+        return self._dirty
+
+    def _layout(self):
+        bitmap = 0
+        for field in self._values:
+            bitmap |= field_bit(field)
+        if bitmap & SECONDARY_WORD:
+            bitmap |= SECONDARY_BIT
+
+        encode_bitmap = self._codecs[1].encode
+        parts = [self._encoded_mti, encode_bitmap(bitmap >> 64)]
+        if bitmap & SECONDARY_BIT:
+            parts.append(encode_bitmap(bitmap & SECONDARY_WORD))
+
+        positions = {}
+        for field in bitmap_fields(bitmap & DATA_FIELDS):
+            positions[field] = len(parts)
+            parts.append(self._encoded[field])
+
+        self._parts = parts
+        self._positions = positions
+
+    def _build(self, fields):
+        if fields:
+            self.update(fields)
+
+        dirty = self._encode_dirty()
+        if self._parts is None:
+            self._layout()
+        else:
+            for field in dirty:
+                self._parts[self._positions[field]] = self._encoded[field]
+        dirty.clear()
+
+        return self._parts
+
+    def build_parts(self, fields=None):
+        return list(self._build(fields))
+
+    def build(self, fields=None):
+        """Apply the given field values and return the encoded message"""
+        return b''.join(self._build(fields))
+
+    def build_into(self, buf, offset=0, length_header=LH.NONE, fields=None):
+        return write_parts(buf, offset, self._build(fields), length_header)
@@ -0,0 +1,185 @@
+from collections.abc import MutableMapping
+
+from py8583.errors import ParseError
+from py8583.py8583 import buffer_view
+
+
+def tag_key(tag):
+    # Tags are ints (0x9F02), hex strings ('9F02') or bytes (b'\x9f\x02')
+    if isinstance(tag, int):
+        return tag
+    if isinstance(tag, str):
+        return int(tag, 16)
+    return int.from_bytes(tag, 'big')
+
+
+def encode_tag(tag):
+    return tag.to_bytes(max(1, (tag.bit_length() + 7) // 8), 'big')
+
+
+def encode_length(length):
+    if length < 0x80:
+        return bytes((length,))
+    size = (length.bit_length() + 7) // 8
+    return bytes((0x80 | size,)) + length.to_bytes(size, 'big')
+
+
+def encode_tlv(tag, value):
+    return encode_tag(tag) + encode_length(len(value)) + bytes(value)
+
+
+def constructed(tag):
+    # bit 6 of the first tag byte
+    return bool((tag >> (8 * ((tag.bit_length() - 1) // 8))) & 0x20)
+
+
+def scan_tlv(data, p=0, end=None):
+    """Yield (tag, start, value start, end) of the BER-TLV objects of data[p:end]
+
+    The 0x00 and 0xFF bytes EMV allows between objects are skipped.
+    """
+    end = len(data) if end is None else end
+    while p < end:
+        start = p
+        tag = data[p]
+        p += 1
+        if tag in (0x00, 0xFF):
+            continue
+
+        if tag & 0x1F == 0x1F:
+            # multi byte tag: more bytes follow while bit 8 is set
+            while True:
+                if p >= end:
+                    raise ParseError("Truncated tag at offset {0}".format(start))
+                tag = (tag << 8) | data[p]
+                p += 1
+                if not data[p - 1] & 0x80:
+                    break
+
+        if p >= end:
+            raise ParseError("Missing length of tag {0:X}".format(tag))
+        length = data[p]
+        p += 1
+        if length & 0x80:
+            size = length & 0x7F
+            if p + size > end:
+                raise ParseError("Truncated length of tag {0:X}".format(tag))
+            length = int.from_bytes(data[p:p + size], 'big')
+            p += size
+
+        if p + length > end:
+            raise ParseError("Value of tag {0:X} runs past the end of the data ({1}>{2})".format(tag, p + length, end))
+
+        yield tag, start, p, p + length
+        p += length
+
+
+class TlvData(MutableMapping):
+    """Lazy BER-TLV view of EMV data (e.g. field 55), tag -> value
+
+    The tag index is built on first access. Values are memoryview slices of the data, and
+    the value of a constructed tag can be read as TlvData with nested(). Changed tags are
+    kept aside: encode() copies the untouched ones from the data as they are and only
+    encodes the changed and new ones, new tags going last.
+    """
+
+    def __init__(self, data=b''):
+        self._data = buffer_view(data)
+        # tag -> (start, value start, end) in data, None until first access
+        self._index = None
+        # tag -> new value, None for deleted tags
+        self._changes = {}
+
+    def _tags(self):
+        if self._index is None:
+            index = {}
+            for tag, start, value_start, end in scan_tlv(self._data):
+                index.setdefault(tag, (start, value_start, end))
+            self._index = index
+        return self._index
+
+    def __getitem__(self, tag):
+        tag = tag_key(tag)
+        if tag in self._changes:
+            value = self._changes[tag]
+            if value is None:
+                raise KeyError(tag)
+            return value
+
+        _, value_start, end = self._tags()[tag]
+        return self._data[value_start:end]
+
+    def __setitem__(self, tag, value):
+        self._changes[tag_key(tag)] = memoryview(bytes(value))
+
+    def __delitem__(self, tag):
+        tag = tag_key(tag)
+        if tag not in self:
+            raise KeyError(tag)
+        self._changes[tag] = None
+
+    def __contains__(self, tag):
+        tag = tag_key(tag)
+        if tag in self._changes:
+            return self._changes[tag] is not None
+        return tag in self._tags()
+
+    def __iter__(self):
+        changes = self._changes
+        for tag in self._tags():
+            if changes.get(tag, True) is not None:
+                yield tag
+        for tag, value in changes.items():
+            if value is not None and tag not in self._index:
+                yield tag
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def nested(self, tag):
+        """The value of a constructed tag, as TlvData"""
+        tag = tag_key(tag)
+        if not constructed(tag):
+            raise ValueError("Tag {0:X} is not constructed".format(tag))
+        return TlvData(self[tag])
+
+    def encode(self):
+        if not self._changes:
+            return bytes(self._data)
+
+        data = self._data
+        changes = self._changes
+        parts = []
+        # runs of untouched tags are copied with a single slice
+        run_start = run_end = None
+
+        for tag, (start, _, end) in self._tags().items():
+            if tag not in changes:
+                if run_end != start:
+                    if run_start is not None:
+                        parts.append(data[run_start:run_end])
+                    run_start = start
+                run_end = end
+                continue
+
+            value = changes[tag]
+            if value is not None:
+                if run_start is not None:
+                    parts.append(data[run_start:run_end])
+                    run_start = run_end = None
+                parts.append(encode_tlv(tag, value))
+
+        if run_start is not None:
+            parts.append(data[run_start:run_end])
+
+        for tag, value in changes.items():
+            if value is not None and tag not in self._index:
+                parts.append(encode_tlv(tag, value))
+
+        return b''.join(parts)
+
+
+def icc_data(message, field=55):
+    """TlvData of the EMV data of an Iso8583 message, None when the field is not set"""
+    data = message.field_bytes(field)
+    return None if data is None else TlvData(data)
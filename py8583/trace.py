@@ -0,0 +1,75 @@
+import logging
+
+from py8583.dump import HexDump, Masks, mask_value
+from py8583.py8583 import Iso8583
+
+
+log = logging.getLogger('py8583.trace')
+
+
+def mask_message(data, spec=None, masks=Masks):
+    """Copy of a raw message with the bytes of its sensitive fields replaced by '*'
+
+    The message is only scanned, not decoded. Whatever follows a field that cannot be scanned
+    is masked too, as is all of a message which mti or bitmap cannot be read.
+    """
+    masked = bytearray(data)
+    try:
+        message = Iso8583(data, iso_spec=spec, lazy=True)
+    except Exception:
+        masked[:] = b'*' * len(masked)
+        return bytes(masked)
+
+    end = 0
+    for field in message.bitmap().set_fields():
+        if field == 1:
+            continue
+
+        span = message.field_span(field)
+        if span is None:
+            # not scanned: the message is broken from the end of the previous field
+            masked[end:] = b'*' * (len(masked) - end)
+            break
+
+        # spans of a truncated message can run past its end
+        start, end = min(span[0], len(masked)), min(span[1], len(masked))
+        if field in masks:
+            masked[start:end] = b'*' * (end - start)
+
+    return bytes(masked)
+
+
+def trace_dump(title, data, spec=None, level=logging.DEBUG, logger=log):
+    """Log a masked hex dump of a raw message, at no cost when level is not enabled for logger"""
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, "%s [%d]:\n%s", title, len(data), HexDump(mask_message(data, spec)))
+
+
+def trace_message(message, level=logging.DEBUG, logger=log):
+    """Log the fields of an Iso8583, sensitive ones masked, if level is enabled for logger"""
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, "%s", MessageText(message))
+
+
+class MessageText:
+    # Masked listing of the fields of a message, formatted when logged only
+
+    __slots__ = ('message',)
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        message = self.message
+        lines = ["mti: [{0}]".format(message.mti())]
+        for field in message.bitmap().set_fields():
+            if field == 1:
+                continue
+            try:
+                value = mask_value(field, message.field_data(field))
+            except Exception as ex:
+                value = "cannot decode: {0}".format(ex)
+            lines.append("\t{0:>3d} - {1: <41} : [{2}]".format(field, message.description(field), value))
+        return "\n".join(lines)
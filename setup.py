@@ -12,5 +12,6 @@ setup(
 
     license='LGPLv2',
     packages=['py8583'],
+    extras_require={'numpy': ['numpy']},
     zip_safe=True
 )
\ No newline at end of file
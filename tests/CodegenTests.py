@@ -0,0 +1,95 @@
+import random
+import unittest
+
+from py8583 import py8583
+from py8583 import py8583spec
+from py8583.enums import DT, LT
+
+
+Specs = (py8583spec.IsoSpec1987ASCII, py8583spec.IsoSpec1987BCD, py8583spec.BICISO, py8583spec.IsoSpec1993ASCII,
+         py8583spec.IsoSpec1993BCD, py8583spec.IsoSpec1987EBCDIC, py8583spec.IsoSpec1993EBCDIC)
+
+
+def random_value(rnd, spec, field):
+    content_type = spec.content_type(field)
+    max_length = spec.max_length(field)
+    fixed = spec.length_type(field) == LT.FIXED
+    length = max_length if fixed else rnd.randint(0, max_length)
+
+    if content_type == 'n':
+        return rnd.randint(0, 10 ** min(length, 18) - 1)
+    elif content_type == 'z':
+        return ''.join(rnd.choice('0123456789=') for _ in range(length))
+    elif content_type == 'b' and spec.data_type(field) == DT.BIN:
+        return ''.join(rnd.choice('0123456789ABCDEF') for _ in range(2 * length))
+    return ''.join(rnd.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789') for _ in range(length))
+
+
+def outcome(function):
+    try:
+        return function()
+    except Exception as ex:
+        return type(ex), str(ex)
+
+
+class Codegen(unittest.TestCase):
+
+    def messages(self, spec, count=100):
+        rnd = random.Random(8583)
+        fields = [field for field in range(2, 129) if field in spec.ContentTypes and field != 65]
+
+        for _ in range(count):
+            generic = py8583.Iso8583(iso_spec=spec)
+            generated = py8583.Iso8583(iso_spec=spec, codegen=True)
+
+            for IsoPacket in (generic, generated):
+                IsoPacket.mti('0200')
+
+            for field in rnd.sample(fields, rnd.randint(1, 30)):
+                value = random_value(rnd, spec, field)
+                for IsoPacket in (generic, generated):
+                    IsoPacket.field(field, 1)
+                    IsoPacket._field_data[field] = value
+
+            yield generic, generated
+
+    def test_Build(self):
+        for Spec in Specs:
+            spec = Spec()
+            built = 0
+            for generic, generated in self.messages(spec):
+                expected = outcome(generic.build_iso)
+                self.assertEqual(outcome(generated.build_iso), expected)
+                built += isinstance(expected, bytes)
+            self.assertGreater(built, 0)
+
+    def test_Parse(self):
+        for Spec in Specs:
+            spec = Spec()
+            for generic, _ in self.messages(spec):
+                content = outcome(generic.build_iso)
+                if not isinstance(content, bytes):
+                    continue
+
+                expected = py8583.Iso8583(content, iso_spec=spec)
+                generated = py8583.Iso8583(content, iso_spec=spec, codegen=True)
+                self.assertEqual(generated.mti(), expected.mti())
+                self.assertEqual(generated.fields(), expected.fields())
+
+    def test_Cache(self):
+        spec = py8583spec.IsoSpec1987BCD()
+        generated = spec.generate()
+
+        self.assertIs(spec.generate(), generated)
+        spec.max_length(2, spec.max_length(2))
+        self.assertIsNot(spec.generate(), generated)
+
+    def test_Shared(self):
+        first = py8583.Iso8583(codegen=True)
+        second = py8583.Iso8583(codegen=True)
+
+        self.assertIs(second._iso_spec.generate(), first._iso_spec.generate())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 import logging
 import struct
+import sys
 
 from py8583.py8583spec import IsoSpec1987ASCII
 
+from py8583.framing import read_frames
 from py8583.py8583 import Iso8583, mem_dump
+from py8583.trace import trace_dump
 
 
 logging.basicConfig(level=logging.DEBUG)
@@ -24,7 +27,15 @@ data = (b"F0F1F0F0723C440188E18008F1F6F5F5"
         b"F4F0F7F0F0F6F4F3F0F2F2F2F0F3F1F0"
         b"F0F0F0F0F0F6F0FF6F4F3F4F6F8F3F2")
 
-mem_dump("Received:", data)
-IsoPacket = Iso8583(data, iso_spec=IsoSpec1987ASCII())
+if len(sys.argv) > 1:
+    # a file of messages with 2 byte binary length headers
+    with open(sys.argv[1], 'rb') as f:
+        for message in read_frames(f):
+            trace_dump("Received:", message, IsoSpec1987ASCII())
+            IsoPacket = Iso8583(message, iso_spec=IsoSpec1987ASCII())
+            IsoPacket.print_message()
+else:
+    mem_dump("Received:", data)
+    IsoPacket = Iso8583(data, iso_spec=IsoSpec1987ASCII())
 
-IsoPacket.print_message()
+    IsoPacket.print_message()
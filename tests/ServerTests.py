@@ -0,0 +1,158 @@
+import asyncio
+import struct
+import unittest
+
+from py8583 import py8583
+from py8583 import py8583spec
+from py8583.client import IsoClient
+from py8583.enums import LH
+from py8583.registry import SpecRegistry
+from py8583.server import IsoServer
+
+
+def echo_request(stan, spec=None):
+    IsoPacket = py8583.Iso8583(iso_spec=spec)
+    IsoPacket.mti('0800')
+    IsoPacket.field(11, 1)
+    IsoPacket.field_data(11, stan)
+    IsoPacket.field(70, 1)
+    IsoPacket.field_data(70, 301)
+    return IsoPacket.build_iso()
+
+
+class Server(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = IsoServer(length_header=LH.BIN2)
+
+        @self.server.handler('0800')
+        async def echo(request):
+            response = py8583.Iso8583()
+            response.mti('0810')
+            response.field(11, 1)
+            response.field_data(11, request.field_data(11))
+            response.field(39, 1)
+            response.field_data(39, '00')
+            return response
+
+        self.listener = await self.server.start('127.0.0.1', 0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    async def read_response(self, reader):
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+        return py8583.Iso8583(await reader.readexactly(length))
+
+    async def test_Echo(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+
+        for stan in range(1, 4):
+            request = echo_request(stan)
+            writer.write(struct.pack('!H', len(request)) + request)
+        await writer.drain()
+
+        responses = [await self.read_response(reader) for _ in range(3)]
+        writer.close()
+
+        self.assertEqual({response.mti() for response in responses}, {'0810'})
+        self.assertEqual(sorted(response.field_data(11) for response in responses),
+                         sorted(py8583.Iso8583(echo_request(stan)).field_data(11) for stan in range(1, 4)))
+
+    async def test_Unhandled(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+
+        request = b'0200' + b'0000000000000000'
+        writer.write(struct.pack('!H', len(request)) + request)
+        request = echo_request(7)
+        writer.write(struct.pack('!H', len(request)) + request)
+        await writer.drain()
+
+        response = await asyncio.wait_for(self.read_response(reader), 5)
+        writer.close()
+
+        self.assertEqual(response.mti(), '0810')
+
+    async def test_Registry(self):
+        self.server.registry = SpecRegistry()
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+
+        for request in (echo_request(1, py8583spec.IsoSpec1987BCD()), echo_request(2)):
+            writer.write(struct.pack('!H', len(request)) + request)
+        await writer.drain()
+
+        responses = [await asyncio.wait_for(self.read_response(reader), 5) for _ in range(2)]
+        writer.close()
+
+        self.assertEqual(sorted(response.field_data(11) for response in responses), [1, 2])
+
+
+class Client(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = IsoServer(length_header=LH.ASCII4)
+
+        @self.server.handler('0200')
+        async def authorize(request):
+            # later requests are answered first
+            await asyncio.sleep(0.05 / request.field_data(4))
+
+            response = py8583.Iso8583()
+            response.mti('0210')
+            for field in (4, 11, 37, 41):
+                response.field(field, 1)
+                response.field_data(field, request.field_data(field))
+            return response
+
+        self.listener = await self.server.start('127.0.0.1', 0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    def authorization(self, amount):
+        IsoPacket = py8583.Iso8583()
+        IsoPacket.mti('0200')
+        for field, value in ((4, amount), (11, amount), (37, 'RRN%09d' % amount), (41, 'TERM0001')):
+            IsoPacket.field(field, 1)
+            IsoPacket.field_data(field, value)
+        return IsoPacket
+
+    async def test_Multiplex(self):
+        async with IsoClient('127.0.0.1', self.port, length_header=LH.ASCII4, pool_size=1, timeout=5) as client:
+            responses = await asyncio.gather(*(client.request(self.authorization(amount)) for amount in range(1, 6)))
+            self.assertEqual(client.pending, {})
+
+        for amount, response in zip(range(1, 6), responses):
+            self.assertEqual(response.mti(), '0210')
+            self.assertEqual(response.field_data(37), 'RRN%09d' % amount)
+
+    async def test_Duplicate(self):
+        # the second request with the same key is refused, not swapped for the first one, even
+        # while the first is still waiting for its connection
+        client = IsoClient('127.0.0.1', self.port, length_header=LH.ASCII4, pool_size=1, timeout=5)
+        try:
+            first, second = await asyncio.gather(client.request(self.authorization(1)),
+                                                 client.request(self.authorization(1)), return_exceptions=True)
+            self.assertEqual(client.pending, {})
+        finally:
+            await client.close()
+
+        self.assertEqual(first.mti(), '0210')
+        self.assertIsInstance(second, ValueError)
+
+    async def test_Timeout(self):
+        async with IsoClient('127.0.0.1', self.port, length_header=LH.ASCII4, pool_size=2) as client:
+            IsoPacket = self.authorization(1)
+            IsoPacket.mti('0100')
+
+            with self.assertRaises(asyncio.TimeoutError):
+                await client.request(IsoPacket, timeout=0.1)
+            self.assertEqual(client.pending, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
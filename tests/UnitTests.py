@@ -1,10 +1,29 @@
 
 import binascii
+import io
 import logging
+import mmap
+import os
+import pickle
+import socket
+import struct
+import tempfile
 import unittest
 
+from py8583 import batch
+from py8583 import bulk
+from py8583 import codec
+from py8583 import dump
+from py8583 import framing
+from py8583 import metrics
+from py8583 import numeric
 from py8583 import py8583
 from py8583 import py8583spec
+from py8583 import registry
+from py8583 import specfile
+from py8583 import template
+from py8583 import trace
+from py8583 import tlv
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -15,6 +34,26 @@ data = (b"F0F1F0F0723C440188E18008F1F6F5F5F3F1F5F75C5C5C5C5CF1F6F5F5F4F0F0F0F0F0
         b"F6F4F3F4F6F8F3F2")
 
 
+def sample_message(fields, mti='0200', **options):
+    # Iso8583 of the (field, value) pairs, options being those of Iso8583
+    IsoPacket = py8583.Iso8583(**options)
+    IsoPacket.mti(mti)
+    for field, value in fields:
+        IsoPacket.field(field, 1)
+        IsoPacket.field_data(field, value)
+    return IsoPacket
+
+
+class SampleTestCase(unittest.TestCase):
+    # Tests on self.content, the message of Fields built with self.spec, an instance of Spec
+    Spec = py8583spec.IsoSpec1987BCD
+    Fields = ((3, 1000), (11, 123), (37, '123456789012'), (41, 'TERM0001'), (70, 301))
+
+    def setUp(self):
+        self.spec = self.Spec()
+        self.content = sample_message(self.Fields, iso_spec=self.spec).build_iso()
+
+
 class AsciiParse1987(unittest.TestCase):
 
     def setUp(self):
@@ -71,7 +110,7 @@ class BCDParse1987(unittest.TestCase):
 
     def setUp(self):
         self.IsoPacket = py8583.Iso8583(iso_spec=py8583spec.IsoSpec1987BCD())
-        self.IsoPacket.strict(True)
+        self.IsoPacket.strict = True
 
     def tearDown(self):
         pass
@@ -102,5 +141,965 @@ class BCDParse1987(unittest.TestCase):
         pass
 
 
+class EbcdicParse1987(unittest.TestCase):
+
+    def setUp(self):
+        self.spec = py8583spec.IsoSpec1987EBCDIC()
+        # the PAN of the sample is masked
+        self.spec.content_type(2, 'ans')
+        self.content = binascii.unhexlify(data)
+
+    def test_Fields(self):
+        IsoPacket = py8583.Iso8583(self.content, iso_spec=self.spec)
+
+        self.assertEqual(IsoPacket.mti(), '0100')
+        self.assertEqual(IsoPacket.field_data(2), '553157*****16554')
+        self.assertEqual(IsoPacket.field_data(4), 2500)
+        self.assertEqual(IsoPacket.field_data(32), 5037)
+        self.assertEqual(IsoPacket.field_data(43), 'TST PARKI              Bajkonur      RUS')
+        self.assertEqual(IsoPacket.field_data(49), '643')
+
+    def test_Build(self):
+        IsoPacket = py8583.Iso8583(self.content, iso_spec=self.spec)
+        content = IsoPacket.build_iso()
+
+        self.assertEqual(content[:12], self.content[:12])
+        self.assertEqual(py8583.Iso8583(content, iso_spec=self.spec).fields(), IsoPacket.fields())
+
+    @unittest.skipUnless(batch.numpy, "numpy is not installed")
+    def test_Batch(self):
+        columns = batch.parse_many([self.content], self.spec, fields=[4, 11], as_numpy=True)
+        self.assertEqual(columns[4].tolist(), [2500])
+        self.assertEqual(columns[11].tolist(), [224400])
+
+    def test_1993(self):
+        spec = py8583spec.IsoSpec1993EBCDIC()
+        IsoPacket = py8583.Iso8583(iso_spec=spec)
+        IsoPacket.mti('1200')
+        for field, value in ((3, 1000), (41, 'TERM0001'), (102, 'ACCOUNT1')):
+            IsoPacket.field(field, 1)
+            IsoPacket.field_data(field, value)
+        content = IsoPacket.build_iso()
+
+        self.assertEqual(content[:4], '1200'.encode('cp037'))
+        self.assertIn('TERM0001'.encode('cp037'), content)
+        self.assertEqual(py8583.Iso8583(content, iso_spec=spec).fields(), IsoPacket.fields())
+
+
+class NumericCodec(unittest.TestCase):
+
+    def test_Bcd(self):
+        for value in (0, 7, 12, 99, 100, 1234, 123456789012, 10 ** 30):
+            self.assertEqual(numeric.bcd_to_int(numeric.int_to_bcd(value)), value)
+        self.assertEqual(numeric.int_to_bcd(12, 3), b'\x00\x12')
+        self.assertEqual(numeric.bcd_to_int(memoryview(b'\x00\x00\x10\x00')), 1000)
+
+        for bcd in (b'\x1A', b'\x01\xF0', b'\x00\x00\x0C', b''):
+            with self.assertRaises(py8583.ParseError):
+                numeric.bcd_to_int(bcd)
+        with self.assertRaises(py8583.BuildError):
+            numeric.int_to_bcd(-1)
+
+    def test_Ascii(self):
+        self.assertEqual(numeric.ascii_to_int(memoryview(b'000012')), 12)
+        self.assertEqual(numeric.int_to_ascii(12, 6), b'000012')
+
+        for digits in (b'1A', b' 12', b'+1', b'1_2', b''):
+            with self.assertRaises(py8583.ParseError):
+                numeric.ascii_to_int(digits)
+
+    def test_Fields(self):
+        for spec in (py8583spec.IsoSpec1987ASCII(), py8583spec.IsoSpec1987BCD()):
+            IsoPacket = py8583.Iso8583(iso_spec=spec)
+            IsoPacket.mti('0200')
+            for field, value in ((3, 1000), (4, 1234), (32, 12345678901)):
+                IsoPacket.field(field, 1)
+                IsoPacket.field_data(field, value)
+
+            parsed = py8583.Iso8583(IsoPacket.build_iso(), iso_spec=spec)
+            self.assertEqual(parsed.fields(), {3: 1000, 4: 1234, 32: 12345678901})
+
+
+class BitmapBuild(unittest.TestCase):
+
+    def test_Fields(self):
+        IsoPacket = py8583.Iso8583()
+        IsoPacket.field(3, 1)
+        IsoPacket.field(4, 1)
+        IsoPacket.field(4, 0)
+
+        self.assertEqual(IsoPacket.field(3), 1)
+        self.assertEqual(IsoPacket.field(4), 0)
+        self.assertEqual(IsoPacket.field(129), None)
+        self.assertEqual(len(IsoPacket.bitmap()), 64)
+        self.assertEqual(list(IsoPacket.bitmap().set_fields()), [3])
+
+        with self.assertRaises(ValueError):
+            IsoPacket.field(129, 1)
+
+    def test_Secondary(self):
+        IsoPacket = py8583.Iso8583()
+        IsoPacket.mti('0800')
+        IsoPacket.field(70, 1)
+        IsoPacket.field_data(70, 301)
+
+        self.assertEqual(IsoPacket.build_iso(), b'08008000000000000000' + b'0400000000000000' + b'301')
+        self.assertEqual(IsoPacket.field(1), 1)
+        self.assertEqual(len(IsoPacket.bitmap()), 128)
+        self.assertEqual(list(IsoPacket.bitmap().set_fields()), [1, 70])
+
+        # a parsed secondary bitmap of no field
+        IsoPacket = py8583.Iso8583(b'08008000000000000000' + b'0000000000000000')
+        self.assertEqual(len(IsoPacket.bitmap()), 128)
+        self.assertEqual(IsoPacket.bitmap()[70], 0)
+
+
+class BufferBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.IsoPacket = py8583.Iso8583()
+        self.IsoPacket.mti('0800')
+        self.IsoPacket.field(70, 1)
+        self.IsoPacket.field_data(70, 301)
+        self.content = self.IsoPacket.build_iso()
+
+    def test_Into(self):
+        buf = bytearray(64)
+        end = self.IsoPacket.build_into(buf, 10)
+
+        self.assertEqual(end, 10 + len(self.content))
+        self.assertEqual(bytes(buf[10:end]), self.content)
+
+    def test_Header(self):
+        buf = bytearray(64)
+
+        end = self.IsoPacket.build_into(memoryview(buf), 0, py8583.LH.BIN2)
+        self.assertEqual(bytes(buf[:end]), struct.pack('!H', len(self.content)) + self.content)
+
+        end = self.IsoPacket.build_into(buf, 0, py8583.LH.ASCII4)
+        self.assertEqual(bytes(buf[:end]), b'%04d' % len(self.content) + self.content)
+
+    def test_Small(self):
+        with self.assertRaises(py8583.BuildError):
+            self.IsoPacket.build_into(bytearray(len(self.content)), 1)
+
+
+class TemplateBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.spec = py8583spec.IsoSpec1987BCD()
+        self.constant = {18: 5411, 22: 51, 25: 0, 32: 123456, 41: 'TERM0001', 42: 'MERCHANT0000001', 49: 840}
+
+    def message(self, fields):
+        return sample_message(fields.items(), iso_spec=self.spec).build_iso()
+
+    def test_Build(self):
+        IsoTemplate = template.MessageTemplate('0200', self.constant, spec=self.spec)
+        fields = dict(self.constant)
+
+        for stan in range(1, 4):
+            changes = {4: stan * 100, 11: stan, 37: '%012d' % stan}
+            fields.update(changes)
+            self.assertEqual(IsoTemplate.build(changes), self.message(fields))
+
+        # changing the set of fields re-lays the message out
+        del IsoTemplate[49]
+        del fields[49]
+        IsoTemplate[70] = 301
+        fields[70] = 301
+        self.assertEqual(IsoTemplate.build(), self.message(fields))
+
+    def test_Into(self):
+        IsoTemplate = template.MessageTemplate('0200', self.constant, spec=self.spec)
+        content = IsoTemplate.build({11: 1})
+
+        buf = bytearray(len(content) + 2)
+        end = IsoTemplate.build_into(buf, length_header=py8583.LH.BIN2)
+        self.assertEqual(bytes(buf[:end]), struct.pack('!H', len(content)) + content)
+
+
+class BufferParse(unittest.TestCase):
+
+    def setUp(self):
+        self.content = b'0200' + b'3000000000000000' + b'000000' + b'000000001000'
+
+    def test_Buffers(self):
+        expected = py8583.Iso8583(self.content).fields()
+
+        for buffer in (bytearray(self.content), memoryview(self.content), memoryview(b'xx' + self.content)[2:]):
+            IsoPacket = py8583.Iso8583(buffer)
+            self.assertEqual(IsoPacket.mti(), '0200')
+            self.assertEqual(IsoPacket.fields(), expected)
+
+    def test_Invalid(self):
+        with self.assertRaises(TypeError):
+            py8583.Iso8583(self.content.decode('latin'))
+
+    def test_Release(self):
+        # a receive buffer can be resized once an eager message is parsed from it
+        buffer = bytearray(self.content + b'0800')
+        IsoPacket = py8583.Iso8583(memoryview(buffer)[:len(self.content)])
+        del buffer[:len(self.content)]
+        self.assertEqual(buffer, b'0800')
+        self.assertEqual(IsoPacket.field_data(4), 1000)
+
+        buffer = bytearray(b'02X0' + b'3000000000000000')
+        with self.assertRaises(py8583.ParseError):
+            py8583.Iso8583(buffer)
+        buffer.extend(b'00000000')
+
+        # lazy messages read the buffer on access
+        buffer = bytearray(self.content)
+        IsoPacket = py8583.Iso8583(buffer, lazy=True)
+        with self.assertRaises(BufferError):
+            del buffer[:4]
+
+
+class LazyParse(SampleTestCase):
+
+    def test_Fields(self):
+        eager = py8583.Iso8583(self.content, iso_spec=self.spec)
+        lazy = py8583.Iso8583(self.content, iso_spec=self.spec, lazy=True)
+
+        self.assertEqual(lazy.mti(), '0200')
+        self.assertEqual(lazy._field_data, {})
+        self.assertEqual(lazy.field_data(41), 'TERM0001')
+        self.assertEqual(set(lazy._field_data), {41})
+        self.assertEqual(lazy.fields(), eager.fields())
+
+    def test_Build(self):
+        lazy = py8583.Iso8583(self.content, iso_spec=self.spec, lazy=True)
+        lazy.field_data(11, 124)
+
+        eager = py8583.Iso8583(self.content, iso_spec=self.spec)
+        eager.field_data(11, 124)
+
+        self.assertEqual(lazy.build_iso(), eager.build_iso())
+
+    def test_Layout(self):
+        # the fields after F2 are laid out from its end
+        content = sample_message(((2, 4111111111111111), (3, 1000), (41, 'TERM0001')), iso_spec=self.spec).build_iso()
+        for message in (self.content, content, content):
+            lazy = py8583.Iso8583(message, iso_spec=self.spec, lazy=True)
+            self.assertEqual(lazy.fields(), py8583.Iso8583(message, iso_spec=self.spec).fields())
+
+        layout = self.spec.layouts()[lazy._bitmap]
+        self.assertIs(lazy._bitmap, layout.bitmap)
+        self.assertEqual((layout.fixed, layout.indexed), ((), 0))
+        self.assertEqual([scan is None for _, scan, _, _ in layout.steps], [False, True, True])
+        bitmap = py8583.Iso8583(self.content, iso_spec=self.spec)._bitmap
+        self.assertEqual([field for field, _, _, _ in self.spec.layouts()[bitmap].fixed], [3, 11, 37, 41, 70])
+
+        # the length of F32 is not BCD: the fields before it are kept
+        content = sample_message(((3, 1000), (32, 123456), (41, 'TERM0001')), iso_spec=self.spec).build_iso()
+        lazy = py8583.Iso8583(content[:13] + b'\xFF' + content[14:], iso_spec=self.spec, lazy=True)
+        self.assertEqual(lazy.fields(), {3: 1000})
+
+
+class CompactParse(SampleTestCase):
+
+    def test_Fields(self):
+        eager = py8583.Iso8583(self.content, iso_spec=self.spec)
+        compact = py8583.Iso8583(bytearray(self.content), iso_spec=self.spec, compact=True)
+
+        self.assertTrue(compact.lazy)
+        self.assertIs(type(compact._iso), bytes)
+        self.assertEqual(compact.field_data(41), 'TERM0001')
+        self.assertEqual(compact.field_data(42), None)
+        self.assertIsNone(compact._field_data)
+        self.assertEqual(compact.fields(), eager.fields())
+
+        compact.field_data(11, 124)
+        eager.field_data(11, 124)
+        self.assertEqual(compact.field_data(11), 124)
+        self.assertEqual(compact._field_data[11], 124)
+        self.assertEqual(compact.fields(), eager.fields())
+        self.assertEqual(compact.build_iso(), eager.build_iso())
+
+    def test_Slots(self):
+        with self.assertRaises(AttributeError):
+            py8583.Iso8583().extra = 1
+
+    def test_Shared(self):
+        # the messages of an mti and bitmap share their str and integers
+        first, second = (py8583.Iso8583(self.content, iso_spec=self.spec, compact=True) for _ in range(2))
+        self.assertIs(first.mti(), second.mti())
+        self.assertIs(first._bitmap, second._bitmap)
+        self.assertIs(first._indexed, second._indexed)
+        self.assertEqual(first._field_index.typecode, 'H')
+
+
+class Instrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.IsoMetrics()
+        self.content = sample_message(((3, 1000), (11, 123), (41, 'TERM0001')), metrics=self.metrics).build_iso()
+
+    def test_Counters(self):
+        py8583.Iso8583(self.content, metrics=self.metrics)
+        # F11 is not numeric
+        py8583.Iso8583(self.content.replace(b'000123', b'0001X3'), metrics=self.metrics)
+        with self.assertRaises(py8583.ParseError):
+            py8583.Iso8583(b'X200' + self.content[4:], metrics=self.metrics)
+
+        self.assertEqual(self.metrics.messages, {('build', '0200'): 1, ('parse', '0200'): 2})
+        self.assertEqual(self.metrics.bytes, {'build': len(self.content), 'parse': 2 * len(self.content)})
+        self.assertEqual(self.metrics.errors, {('parse', 11): 1, ('parse', 'mti'): 1})
+        self.assertEqual(self.metrics.field_times[('parse', 3)].count, 2)
+        self.assertEqual(self.metrics.field_times[('parse', 41)].count, 1)
+        self.assertEqual(self.metrics.field_times[('build', 41)].count, 1)
+
+    def test_Export(self):
+        py8583.Iso8583(self.content, metrics=self.metrics)
+
+        samples = []
+        self.metrics.export(lambda *sample: samples.append(sample))
+        self.assertIn(('py8583_messages_total', {'direction': 'parse', 'mti': '0200'}, 1), samples)
+
+        text = self.metrics.prometheus()
+        self.assertIn('# TYPE py8583_field_seconds histogram', text)
+        self.assertIn('py8583_field_seconds_bucket{direction="parse",field="3",le="+Inf"} 1', text)
+        self.assertIn('py8583_field_seconds_count{direction="build",field="41"} 1', text)
+        self.assertIn('py8583_bytes_total{direction="parse"} %d' % len(self.content), text)
+
+    def test_Labels(self):
+        # mtis of no known class are counted together, the non strict parse lets them through
+        for mti in (b'0200', b'0A00', b'0900', b'0280'):
+            py8583.Iso8583(mti + self.content[4:], metrics=self.metrics)
+        self.assertEqual(self.metrics.messages, {('build', '0200'): 1, ('parse', '0200'): 1, ('parse', '0900'): 1,
+                                                 ('parse', 'invalid'): 2})
+
+        # label values are escaped
+        self.metrics.reset()
+        self.metrics.messages[('parse', 'a"b\\c\nd')] = 1
+        self.assertIn('py8583_messages_total{direction="parse",mti="a\\"b\\\\c\\nd"} 1', self.metrics.prometheus())
+
+
+class Tracing(unittest.TestCase):
+
+    def setUp(self):
+        self.content = sample_message(((2, '4761739001010119'), (3, 0), (35, '4761739001010119=25121011234'),
+                                       (41, 'TERM0001'))).build_iso()
+
+    def test_Dump(self):
+        self.assertEqual(dump.hex_dump(b'0200\x00\xff', size=4), "30 32 30 30 | 0200\n00 ff       | ..")
+
+    def test_Mask(self):
+        self.assertEqual(dump.mask_pan('4761739001010119'), '476173******0119')
+        self.assertEqual(dump.mask_track2('4761739001010119=25121011234'), '476173******0119=***********')
+
+        masked = trace.mask_message(self.content)
+        self.assertEqual(len(masked), len(self.content))
+        self.assertNotIn(b'47617390', masked)
+        self.assertNotIn(b'2512', masked)
+        self.assertIn(b'16' + b'*' * 16, masked)
+        self.assertTrue(masked.endswith(b'TERM0001'))
+
+        self.assertTrue(trace.mask_message(self.content[:-15]).endswith(b'28' + b'*' * 21))
+        # past a field that cannot be scanned, everything is masked
+        broken = trace.mask_message(self.content.replace(b'284761', b'2X4761'))
+        self.assertTrue(broken.endswith(b'000000' + b'*' * 38))
+
+    def test_Log(self):
+        logger = logging.getLogger('py8583.trace.test')
+        logger.setLevel(logging.INFO)
+        # nothing is done at all for disabled levels
+        trace.trace_dump("Received", None, logger=logger)
+        trace.trace_message(None, logger=logger)
+
+        with self.assertLogs(logger, logging.INFO) as logs:
+            trace.trace_dump("Received", self.content, level=logging.INFO, logger=logger)
+            trace.trace_message(py8583.Iso8583(self.content, lazy=True), level=logging.INFO, logger=logger)
+        self.assertNotIn('4761739001010119', "\n".join(logs.output))
+        self.assertIn('476173******0119=', logs.output[1])
+
+        with self.assertLogs('py8583', logging.DEBUG) as logs:
+            py8583.Iso8583(self.content).debug_message()
+        self.assertIn('476173******0119', logs.output[2])
+
+
+class EmvData(unittest.TestCase):
+
+    def setUp(self):
+        self.data = binascii.unhexlify(
+            '9F0206000000001000' '9F0306000000000000' '82025800' '9F1A020840' '950500000000009A03251018' '9C0100'
+            '7007' '5F200454455354' '0000' 'DF0181C8' + 'AB' * 200)
+
+    def test_Tags(self):
+        icc = tlv.TlvData(self.data)
+
+        self.assertIsInstance(icc[0x9F02], memoryview)
+        self.assertEqual(bytes(icc['9F02']), b'\x00\x00\x00\x00\x10\x00')
+        self.assertEqual(bytes(icc[b'\x82']), b'\x58\x00')
+        self.assertEqual(bytes(icc[0xDF01]), b'\xab' * 200)
+        self.assertEqual(list(icc), [0x9F02, 0x9F03, 0x82, 0x9F1A, 0x95, 0x9A, 0x9C, 0x70, 0xDF01])
+        self.assertEqual(bytes(icc.nested(0x70)[0x5F20]), b'TEST')
+        with self.assertRaises(ValueError):
+            icc.nested(0x9F02)
+
+        with self.assertRaises(py8583.ParseError):
+            list(tlv.TlvData(self.data[:-1]))
+
+    def test_Encode(self):
+        icc = tlv.TlvData(self.data)
+        self.assertEqual(icc.encode(), self.data)
+
+        icc[0x9F02] = b'\x00\x00\x00\x00\x20\x00'
+        del icc['9C']
+        icc['9F10'] = b'\x01\x02'
+        content = icc.encode()
+
+        self.assertTrue(content.startswith(binascii.unhexlify('9F0206000000002000' '9F0306000000000000')))
+        self.assertTrue(content.endswith(b'\xab' * 200 + binascii.unhexlify('9F10020102')))
+        self.assertEqual({tag: bytes(value) for tag, value in tlv.TlvData(content).items()},
+                         {tag: bytes(value) for tag, value in icc.items()})
+        self.assertNotIn(0x9C, tlv.TlvData(content))
+
+    def test_Message(self):
+        spec = py8583spec.IsoSpec1987BCD()
+        IsoPacket = py8583.Iso8583(iso_spec=spec)
+        IsoPacket.mti('0100')
+        IsoPacket.field(55, 1)
+        IsoPacket.field_bytes(55, self.data)
+        content = IsoPacket.build_iso()
+
+        lazy = py8583.Iso8583(content, iso_spec=spec, lazy=True)
+        self.assertIsInstance(lazy.field_bytes(55), memoryview)
+        icc = tlv.icc_data(lazy)
+        self.assertEqual(bytes(icc[0x9F1A]), b'\x08\x40')
+
+        icc[0x9F1A] = b'\x09\x78'
+        lazy.field_bytes(55, icc.encode())
+        parsed = py8583.Iso8583(lazy.build_iso(), iso_spec=spec)
+        self.assertEqual(bytes(tlv.icc_data(parsed)[0x9F1A]), b'\x09\x78')
+        self.assertIsNone(tlv.icc_data(py8583.Iso8583(iso_spec=spec)))
+
+        # hex text in ASCII specs
+        spec = py8583spec.IsoSpec1993ASCII()
+        IsoPacket = py8583.Iso8583(iso_spec=spec)
+        IsoPacket.mti('1100')
+        IsoPacket.field(55, 1)
+        IsoPacket.field_bytes(55, self.data[:40])
+        lazy = py8583.Iso8583(IsoPacket.build_iso(), iso_spec=spec, lazy=True)
+        self.assertEqual(lazy.field_bytes(55), self.data[:40])
+
+    def test_MaxLength(self):
+        # maximum lengths of binary and hex text fields are in bytes
+        for spec, field, length in ((py8583spec.IsoSpec1987ASCII(), 52, 8), (py8583spec.IsoSpec1987BCD(), 55, 999)):
+            data = (bytes(range(256)) * 4)[:length]
+            IsoPacket = py8583.Iso8583(iso_spec=spec)
+            IsoPacket.mti('0100')
+            IsoPacket.field(field, 1)
+            IsoPacket.field_bytes(field, data)
+            parsed = py8583.Iso8583(IsoPacket.build_iso(), iso_spec=spec)
+            self.assertEqual(bytes(parsed.field_bytes(field)), data)
+
+            with self.assertRaises(ValueError):
+                IsoPacket.field_bytes(field, data + b'\x00')
+
+
+class PrivateData(py8583spec.IsoSpec):
+    # Subfields of field 127, with a binary bitmap
+
+    def set_descriptions(self):
+        self.Descriptions = {1: 'Bitmap', 2: 'Switch key', 3: 'Routing information', 12: 'Terminal owner',
+                             22: 'Structured data', 33: 'Extended transaction type'}
+
+    def set_content_types(self):
+        self.ContentTypes = {
+            2: {'content_type': 'ans', 'MaxLen': 32, 'len_type': py8583.LT.LLVAR},
+            3: {'content_type': 'ans', 'MaxLen': 12, 'len_type': py8583.LT.FIXED},
+            12: {'content_type': 'ans', 'MaxLen': 25, 'len_type': py8583.LT.LLVAR},
+            22: {'content_type': 'ans', 'MaxLen': 999, 'len_type': py8583.LT.LLLVAR},
+            33: {'content_type': 'n', 'MaxLen': 4, 'len_type': py8583.LT.FIXED},
+        }
+
+    def set_data_types(self):
+        self.data_type(1, py8583.DT.BIN)
+        for field in self.ContentTypes.keys():
+            self.data_type(field, py8583.DT.ASCII)
+            if self.length_type(field) != py8583.LT.FIXED:
+                self.length_data_type(field, py8583.DT.ASCII)
+
+
+class PrivateDataSpec(py8583spec.IsoSpec1987ASCII):
+
+    def set_data_types(self):
+        super(PrivateDataSpec, self).set_data_types()
+        self.nested_spec(127, PrivateData())
+
+
+class CompositeFields(SampleTestCase):
+    Spec = PrivateDataSpec
+    Fields = ((11, 1234), (127, {2: 'KEY0001', 3: 'ROUTE1      ', 22: 'Postilion:MetaData', 33: 6000}))
+
+    def test_Spec(self):
+        self.assertIsInstance(self.spec.nested_spec(127), PrivateData)
+        self.assertIsNone(self.spec.nested_spec(126))
+        self.assertIs(self.spec.compile()[127].nested, self.spec.nested_spec(127))
+        self.assertIsNone(py8583spec.IsoSpec1987ASCII().nested_spec(127))
+
+    def test_Parse(self):
+        # 8 bitmap bytes, then the subfields
+        self.assertIn(b'054\x60\x00\x04\x00\x80\x00\x00\x0007KEY0001ROUTE1      018Postilion:MetaData6000',
+                      self.content)
+
+        for options in ({}, {'lazy': True}, {'compact': True}, {'codegen': True}):
+            IsoPacket = py8583.Iso8583(self.content, iso_spec=self.spec, **options)
+            private = IsoPacket.field_data(127)
+            self.assertIsInstance(private, py8583.CompositeField)
+            self.assertEqual(list(private), [2, 3, 22, 33])
+            self.assertEqual(private[2], 'KEY0001')
+            self.assertEqual(private[33], 6000)
+            self.assertNotIn(12, private)
+            self.assertEqual(IsoPacket.field_data(11), 1234)
+            self.assertEqual(IsoPacket.build_iso(), self.content)
+
+    def test_Lazy(self):
+        # subfields are only decoded when read
+        content = self.content.replace(b'6000', b'6X00')
+        private = py8583.Iso8583(content, iso_spec=self.spec).field_data(127)
+        self.assertEqual(private[22], 'Postilion:MetaData')
+        with self.assertRaises(py8583.ParseError):
+            private[33]
+
+        private = py8583.Iso8583(content.replace(b'018Post', b'099Post'), iso_spec=self.spec).field_data(127)
+        with self.assertRaises(py8583.ParseError):
+            private[2]
+
+    def test_Eager(self):
+        # eager messages keep their own copy of composite fields, not a view of the caller's buffer
+        for options in ({}, {'strict': True}, {'codegen': True}):
+            buffer = bytearray(self.content)
+            private = py8583.Iso8583(buffer, iso_spec=self.spec, **options).field_data(127)
+            buffer[buffer.index(b'KEY0001'):][:7] = b'XXXXXXX'
+            buffer.extend(b'0000')
+            self.assertEqual(private[2], 'KEY0001')
+
+    def test_Build(self):
+        IsoPacket = py8583.Iso8583(self.content, iso_spec=self.spec, lazy=True)
+        private = IsoPacket.field_data(127)
+        private[12] = 'OWNER'
+        del private[22]
+        self.assertEqual(list(private), [2, 3, 12, 33])
+
+        parsed = py8583.Iso8583(IsoPacket.build_iso(), iso_spec=self.spec)
+        self.assertEqual(parsed.field_data(127), {2: 'KEY0001', 3: 'ROUTE1      ', 12: 'OWNER', 33: 6000})
+        self.assertEqual(bytes(parsed.field_bytes(127)), bytes(private))
+
+        IsoPacket.field_data(127, {2: 'K' * 33})
+        with self.assertRaises(py8583.BuildError):
+            IsoPacket.build_iso()
+
+
+class SpecDispatch(unittest.TestCase):
+
+    def build(self, spec, mti):
+        return sample_message(((11, 123456), (41, 'TERM0001')), mti, iso_spec=spec).build_iso()
+
+    def test_Sniff(self):
+        self.assertEqual(registry.sniff(b'0200'), (py8583.DT.ASCII, 0))
+        self.assertEqual(registry.sniff(b'\xf1\xf2\xf0\xf0'), (py8583.DT.EBCDIC, 1))
+        self.assertEqual(registry.sniff(b'\x12\x00'), (py8583.DT.BCD, 1))
+        self.assertIsNone(registry.sniff(b'\xaa'))
+        self.assertIsNone(registry.sniff(b''))
+
+    def test_Dispatch(self):
+        specs = registry.SpecRegistry()
+
+        for spec_class, mti in ((py8583spec.IsoSpec1987ASCII, '0200'), (py8583spec.IsoSpec1987BCD, '0200'),
+                                (py8583spec.IsoSpec1987EBCDIC, '0200'), (py8583spec.IsoSpec1993ASCII, '1200'),
+                                (py8583spec.IsoSpec1993BCD, '1200'), (py8583spec.IsoSpec1993EBCDIC, '1200')):
+            content = self.build(spec_class(), mti)
+            self.assertIsInstance(specs.spec(content), spec_class)
+            IsoPacket = specs.parse(content, lazy=True)
+            self.assertEqual(IsoPacket.mti(), mti)
+            self.assertEqual(IsoPacket.field_data(11), 123456)
+            self.assertEqual(IsoPacket.field_data(41), 'TERM0001')
+
+        # specs are compiled once, when registered
+        content = self.build(py8583spec.IsoSpec1993BCD(), '1200')
+        self.assertIs(specs.spec(content), specs.spec(content))
+
+        with self.assertRaises(py8583.ParseError):
+            specs.spec(self.build(py8583spec.IsoSpec1987ASCII(), '2200'))
+        with self.assertRaises(py8583.ParseError):
+            specs.spec(b'\xaa\xbb')
+
+    def test_Register(self):
+        specs = registry.SpecRegistry({})
+        with self.assertRaises(py8583.ParseError):
+            specs.spec(b'0200')
+
+        specs.register(py8583.MsgVersion.ISO1987, py8583.DT.ASCII, py8583spec.BICISO)
+        self.assertIsInstance(specs.spec(b'0200'), py8583spec.BICISO)
+        self.assertEqual(list(specs.specs()), [(py8583.MsgVersion.ISO1987, py8583.DT.ASCII)])
+
+        with self.assertRaises(py8583.SpecError):
+            specs.register(py8583.MsgVersion.ISO1993, py8583.DT.BCD, py8583spec.IsoSpec1993ASCII)
+
+
+class SpecFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_Json(self):
+        path = self.write('biciso.json', '''{
+            "base": "IsoSpec1987ASCII",
+            "fields": {"41": {"max_length": 16}, "44": {"max_length": 27}}
+        }''')
+        spec = specfile.load_spec(path)
+
+        self.assertIsInstance(spec, py8583spec.IsoSpec1987ASCII)
+        self.assertEqual(spec.ContentTypes, py8583spec.BICISO().ContentTypes)
+        self.assertEqual(spec.DataTypes, py8583spec.BICISO().DataTypes)
+        self.assertEqual(py8583spec.IsoSpec1987ASCII().max_length(41), 8)
+
+    def test_Toml(self):
+        path = self.write('private.toml', '''
+            base = "IsoSpec1987BCD"
+
+            [fields.127]
+            description = "Private data"
+            data_type = "BIN"
+
+            [fields.127.nested.fields.1]
+            data_type = "BIN"
+
+            [fields.127.nested.fields.2]
+            content_type = "ans"
+            max_length = 32
+            length_type = "LLVAR"
+            data_type = "ASCII"
+            length_data_type = "BCD"
+            ''')
+        spec = specfile.load_spec(path)
+
+        self.assertEqual(spec.description(127), 'Private data')
+        IsoPacket = py8583.Iso8583(iso_spec=spec)
+        IsoPacket.mti('0200')
+        IsoPacket.field(127, 1)
+        IsoPacket.field_data(127, {2: 'KEY0001'})
+        parsed = py8583.Iso8583(IsoPacket.build_iso(), iso_spec=spec)
+        self.assertEqual(parsed.field_data(127)[2], 'KEY0001')
+
+    def test_Errors(self):
+        for text in ('{"base": "IsoSpec9999"}', '{"fields": {"200": {"max_length": 1}}}',
+                     '{"fields": {"2": {"width": 1}}}', '{"fields": {"2": {"length_type": "LLLLVAR"}}}',
+                     '{"fields": {"2": {"content_type": "x"}}}'):
+            with self.assertRaises(py8583.SpecError):
+                specfile.load_spec(self.write('bad.json', text))
+
+        with self.assertRaises(py8583.SpecError):
+            specfile.load_spec(self.write('spec.yaml', 'base: IsoSpec1987ASCII'))
+
+    def test_Cache(self):
+        cache_dir = os.path.join(self.directory.name, 'cache')
+        path = self.write('biciso.json', '{"base": "IsoSpec1987ASCII", "fields": {"41": {"max_length": 16}}}')
+        content = b'02000000000000800000TERMINAL00000001'
+
+        first = specfile.load_spec(path, cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        cached = specfile.load_spec(path, cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        self.assertEqual(cached.ContentTypes, first.ContentTypes)
+        for spec in (first, cached):
+            self.assertEqual(py8583.Iso8583(content, iso_spec=spec, codegen=True).field_data(41), 'TERMINAL00000001')
+
+        # another content is another entry
+        self.write('biciso.json', '{"base": "IsoSpec1987ASCII", "fields": {"41": {"max_length": 12}}}')
+        self.assertEqual(specfile.load_spec(path, cache_dir).max_length(41), 12)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+        # unreadable entries are rebuilt
+        for name in os.listdir(cache_dir):
+            with open(os.path.join(cache_dir, name), 'wb') as f:
+                f.write(b'junk')
+        self.assertEqual(specfile.load_spec(path, cache_dir).max_length(41), 12)
+
+
+class StrictParse(unittest.TestCase):
+
+    def build(self, spec):
+        return sample_message(((2, 4111111111111111), (11, 123), (35, '4111111111111111=2512'), (41, 'TERM0001'),
+                               (49, '840')), iso_spec=spec).build_iso()
+
+    def parse(self, content, spec, **options):
+        return py8583.Iso8583(content, iso_spec=spec, strict=True, **options)
+
+    def test_Ascii(self):
+        spec = py8583spec.IsoSpec1987ASCII()
+        content = self.build(spec)
+        for options in ({}, {'lazy': True}, {'codegen': True}):
+            self.assertEqual(self.parse(content, spec, **options).field_data(41), 'TERM0001')
+
+        # F49 ('an') is the last field
+        invalid = content[:-3] + b'8\x000'
+        self.assertEqual(py8583.Iso8583(invalid, iso_spec=spec).field_data(41), 'TERM0001')
+        for options in ({}, {'lazy': True}, {'codegen': True}, {'metrics': metrics.IsoMetrics()}):
+            with self.assertRaisesRegex(py8583.ParseError, "F49 has invalid characters"):
+                self.parse(invalid, spec, **options)
+
+        with self.assertRaisesRegex(py8583.ParseError, "F41 has invalid characters"):
+            self.parse(content.replace(b'TERM0001', b'TERM\t001'), spec)
+        with self.assertRaisesRegex(py8583.ParseError, "F35 has invalid characters"):
+            self.parse(content.replace(b'=2512', b'X2512'), spec)
+
+    def test_Length(self):
+        spec = py8583spec.IsoSpec1987ASCII()
+        content = self.build(spec)
+
+        # F49 is cut short
+        for options in ({}, {'lazy': True}, {'codegen': True}, {'metrics': metrics.IsoMetrics()}):
+            with self.assertRaisesRegex(py8583.ParseError, "F49 is truncated"):
+                self.parse(content[:-1], spec, **options)
+
+        # F49 is followed by bytes of no field, which only exact messages reject
+        for options in ({}, {'lazy': True}, {'codegen': True}, {'metrics': metrics.IsoMetrics()}):
+            self.assertEqual(self.parse(content + b'00', spec, **options).field_data(49), '840')
+            for strict in (False, True):
+                with self.assertRaisesRegex(py8583.ParseError, "2 bytes after the last field"):
+                    py8583.Iso8583(content + b'00', iso_spec=spec, strict=strict, exact=True, **options)
+        self.assertEqual(py8583.Iso8583(content, iso_spec=spec, exact=True).field_data(49), '840')
+        with self.assertRaisesRegex(py8583.ParseError, "1 bytes missing after the last field"):
+            py8583.Iso8583(content[:-1], iso_spec=spec, lazy=True, exact=True)
+
+    def test_Ebcdic(self):
+        spec = py8583spec.IsoSpec1987EBCDIC()
+        content = self.build(spec)
+        self.assertEqual(self.parse(content, spec).field_data(35), '4111111111111111=2512')
+
+        with self.assertRaisesRegex(py8583.ParseError, "F41 has invalid characters"):
+            self.parse(content.replace('TERM'.encode('cp037'), b'TE\x00M'), spec)
+
+    def test_Tables(self):
+        self.assertEqual(set(codec.ContentCharacters), set(py8583spec.IsoSpec._ValidContentTypes))
+        codecs = py8583spec.IsoSpec1987BCD().compile()
+        self.assertIsNone(codecs[2].marks)
+        self.assertIs(codecs[41].marks, codec.ContentMarks[(py8583.DT.ASCII, 'ans')])
+
+
+class BatchParse(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [b'0200' + b'3000000000000000' + b'000000' + b'000000001000',
+                         bytearray(b'0800' + b'2000000000000000' + b'000001'),
+                         b'X200',
+                         b'0200' + b'1000000000000000' + b'000000000042']
+
+    def test_Columns(self):
+        columns = batch.parse_many(self.messages)
+
+        self.assertEqual(columns['mti'], ['0200', '0800', None, '0200'])
+        self.assertEqual([error is None for error in columns['error']], [True, True, False, True])
+        for field in (3, 4):
+            self.assertEqual(columns[field], [py8583.Iso8583(message).field_data(field) if i != 2 else None
+                                              for i, message in enumerate(self.messages)])
+
+    def test_Fields(self):
+        columns = batch.parse_many(self.messages, fields=[3])
+
+        self.assertEqual(set(columns), {'mti', 'error', 3})
+        self.assertEqual(columns[3], [0, 1, None, None])
+
+    @unittest.skipUnless(batch.numpy, "numpy is not installed")
+    def test_Numpy(self):
+        columns = batch.parse_many(self.messages, as_numpy=True)
+
+        self.assertEqual(columns[3].dtype, batch.numpy.int64)
+        self.assertEqual(list(columns[3].mask), [False, False, True, True])
+
+    @unittest.skipUnless(batch.numpy, "numpy is not installed")
+    def test_Digits(self):
+        messages = self.messages + [b'0200' + b'3000000000000000' + b'00001A' + b'000000001000',
+                                    b'0200' + b'3000000000000000' + b'000002' + b'0000010']
+        columns = batch.parse_many(messages, fields=[3, 4], as_numpy=True)
+
+        self.assertEqual(columns[4].tolist(), [1000, None, None, 42, 1000, None])
+        self.assertEqual(columns[3].tolist(), [0, 1, None, None, None, None])
+        self.assertEqual(columns['error'][4], "F3 is not numeric")
+        self.assertIn("F4 is truncated", columns['error'][5])
+
+        spec = py8583spec.IsoSpec1987BCD()
+        messages = []
+        for amount in (0, 12, 123456789012):
+            IsoPacket = py8583.Iso8583(iso_spec=spec)
+            IsoPacket.mti('0200')
+            IsoPacket.field(4, 1)
+            IsoPacket.field_data(4, amount)
+            messages.append(IsoPacket.build_iso())
+
+        columns = batch.parse_many(messages, spec, fields=[4], as_numpy=True)
+        self.assertEqual(columns[4].tolist(), [0, 12, 123456789012])
+
+
+class BulkDecode(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [b'0200' + b'3000000000000000' + b'%06d' % i + b'%012d' % (i * 3) for i in range(200)]
+
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            for message in self.messages:
+                f.write(struct.pack('!H', len(message)) + message)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_Chunks(self):
+        chunks = list(bulk.plan_chunks(self.path, py8583.LH.BIN2, 1000))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], os.path.getsize(self.path))
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+
+    def test_Decode(self):
+        expected = batch.parse_many(self.messages)
+
+        columns = {'mti': [], 3: [], 4: []}
+        for chunk in bulk.decode_file(self.path, length_header=py8583.LH.BIN2, chunk_size=1000, workers=2):
+            for key in columns:
+                columns[key].extend(chunk[key])
+
+        for key in columns:
+            self.assertEqual(columns[key], expected[key])
+
+
+class FrameRead(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [b'0800' + b'2000000000000000' + b'%06d' % i for i in range(5)]
+        self.frames = b''.join(struct.pack('!H', len(message)) + message for message in self.messages)
+
+    def test_Buffer(self):
+        frames = list(framing.read_frames(bytearray(self.frames)))
+
+        self.assertTrue(all(isinstance(frame, memoryview) for frame in frames))
+        self.assertEqual([bytes(frame) for frame in frames], self.messages)
+
+    def test_Mmap(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(self.frames)
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                frames = [bytes(frame) for frame in framing.read_frames(data)]
+
+        self.assertEqual(frames, self.messages)
+
+    def test_File(self):
+        frames = list(framing.read_frames(io.BufferedReader(io.BytesIO(self.frames), buffer_size=7)))
+        self.assertEqual(frames, self.messages)
+
+        with self.assertRaises(py8583.ParseError):
+            list(framing.read_frames(io.BytesIO(self.frames[:-1])))
+
+    def test_Socket(self):
+        left, right = socket.socketpair()
+        with left, right:
+            left.sendall(b''.join(b'%04d' % (len(message) + 5) + b'\x60\x00\x01\x00\x00' + message
+                                  for message in self.messages))
+            left.shutdown(socket.SHUT_WR)
+
+            frames = list(framing.read_frames(right, py8583.LH.ASCII4, tpdu=True))
+
+        # no file object of the socket is left open to keep it from closing
+        self.assertEqual(right.fileno(), -1)
+        self.assertEqual([tpdu for tpdu, _ in frames], [b'\x60\x00\x01\x00\x00'] * 5)
+        self.assertEqual([message for _, message in frames], self.messages)
+
+
+class TerminalSpec(py8583spec.IsoSpec1987ASCII):
+    # the terminal id length is a constructor argument
+    ShareTables = False
+
+    def __init__(self, terminal_length):
+        self.terminal_length = terminal_length
+        super().__init__()
+
+    def set_content_types(self):
+        super().set_content_types()
+        self.ContentTypes[41] = dict(self.ContentTypes[41], MaxLen=self.terminal_length)
+
+
+class AcquirerSpec(py8583spec.IsoSpec1987ASCII):
+
+    def __init__(self, acquirer):
+        self.acquirer = acquirer
+        super().__init__()
+
+
+class SpecCompile(unittest.TestCase):
+
+    def test_Table(self):
+        spec = py8583spec.IsoSpec1987BCD()
+        codecs = spec.compile()
+
+        self.assertEqual(len(codecs), 129)
+        self.assertIs(spec.compile(), codecs)
+        self.assertEqual(codecs[0].data_type, py8583.DT.BCD)
+        self.assertEqual(codecs[1].data_type, py8583.DT.BIN)
+        self.assertEqual(codecs[2].len_type, py8583.LT.LLVAR)
+        self.assertEqual(codecs[2].len_data_type, py8583.DT.BCD)
+        self.assertEqual(codecs[2].max_length, spec.max_length(2))
+
+        # setters drop the compiled table
+        spec.max_length(2, spec.max_length(2))
+        self.assertIsNot(spec.compile(), codecs)
+
+    def test_Shared(self):
+        bcd, ascii = py8583spec.IsoSpec1987BCD(), py8583spec.IsoSpec1987ASCII()
+
+        # variants no longer leak into each other
+        self.assertEqual(bcd.content_type(105), 'b')
+        self.assertEqual(ascii.content_type(105), 'ans')
+        self.assertEqual(ascii.data_type(2), py8583.DT.ASCII)
+        self.assertEqual(py8583spec.BICISO().max_length(41), 16)
+        self.assertEqual(ascii.max_length(41), 8)
+
+        # instances of a variant share their tables and codecs until changed
+        other = py8583spec.IsoSpec1987ASCII()
+        self.assertIs(other.ContentTypes, ascii.ContentTypes)
+        self.assertIs(other.compile(), ascii.compile())
+        with self.assertRaises(TypeError):
+            other.ContentTypes[41]['MaxLen'] = 16
+
+        other.max_length(41, 16)
+        self.assertEqual(other.max_length(41), 16)
+        self.assertEqual(ascii.max_length(41), 8)
+        self.assertEqual(py8583spec.IsoSpec1987ASCII().max_length(41), 8)
+
+    def test_Unshared(self):
+        short, long = TerminalSpec(8), TerminalSpec(16)
+        self.assertEqual(short.max_length(41), 8)
+        self.assertEqual(long.max_length(41), 16)
+        self.assertEqual(long.compile()[41].max_length, 16)
+        self.assertEqual(pickle.loads(pickle.dumps(long)).max_length(41), 16)
+
+    def test_Pickle(self):
+        # specs are unpickled without running __init__, which may take arguments
+        spec = pickle.loads(pickle.dumps(AcquirerSpec('123456')))
+        self.assertEqual(spec.acquirer, '123456')
+        self.assertIs(spec.ContentTypes, AcquirerSpec('000000').ContentTypes)
+        self.assertEqual(spec.max_length(41), 8)
+
+    def test_Codec(self):
+        codecs = py8583spec.IsoSpec1987ASCII().compile()
+
+        self.assertEqual(codecs[11].encode(123), b'000123')
+        self.assertEqual(codecs[41].encode('TERM01'), b'  TERM01')
+        self.assertEqual(codecs[37].decode(b'xx123456789012', 2), ('123456789012', 14))
+
+
 if __name__ == '__main__':
     unittest.main()